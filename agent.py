@@ -48,6 +48,9 @@ def game_logic(game_state: Game, missions: Missions, observation: Observation, D
     print("actions_by_units_supplementary", actions_by_units_supplementary)
     print("state_annotations", state_annotations)
     print("movement_annotations", movement_annotations)
+    cache = game_state.path_distance_cache
+    print("path_distance_cache", "hits", cache.hits, "misses", cache.misses,
+          "invalidations", cache.invalidations, "single_pair_searches", cache.single_pair_searches)
     # actions = actions_by_cities + actions_by_units_initial + pre_actions_by_units + actions_by_units + actions_by_units_supplementary
     # actions += cluster_annotations_and_ejections + cluster_annotations_and_ejections_pre
     # actions += mission_annotations + movement_annotations + state_annotations
@@ -72,8 +75,9 @@ def agent(observation: Observation, configuration, DEBUG=False):
         game_state._update(observation["updates"][2:])
         game_state.fix_iteration_order()
     else:
-        # actually rebuilt and recomputed from scratch
-        game_state._update(observation["updates"])
+        # the map and entities are kept, only the lines that changed are applied
+        # the resource amount matrices are updated from the changes, the other features are recomputed from scratch
+        game_state._update_incremental(observation["updates"])
 
     if not os.environ.get('GFOOTBALL_DATA_DIR', ''):  # on Kaggle compete, do not save items
         str_step = str(observation["step"]).zfill(3)
@@ -0,0 +1,85 @@
+# compares the shortest path kernels of lux/game_paths.py with a Dijkstra over tuples and dicts
+# python3 benchmark_paths.py [repeats]
+
+import heapq
+import sys
+import time
+
+import numpy as np
+
+from lux.game_geometry import get_map_geometry
+from lux.game_paths import PATH_SEARCH_KERNELS, get_edge_lengths
+
+
+def distance_to_target_with_tuples(edge_lengths, sx, sy):
+    # a Dijkstra over tuples and dicts from the target, with the edge lengths precomputed
+    height, width = edge_lengths.shape
+    xy_processed = set()
+    distance_to_target = {}
+    heap = [(0, (sx,sy)),]
+    while heap:
+        curdist, (x,y) = heapq.heappop(heap)
+        if (x,y) in xy_processed:
+            continue
+        xy_processed.add((x,y),)
+        distance_to_target[x,y] = curdist
+        for dx,dy in [(0,-1), (1,0), (0,1), (-1,0)]:
+            xx,yy = x+dx,y+dy
+            if not (0 <= xx < width and 0 <= yy < height):
+                continue
+            if (xx,yy) in xy_processed:
+                continue
+            heapq.heappush(heap, (curdist + int(edge_lengths[yy,xx]), (xx,yy)))
+    return distance_to_target
+
+
+def make_edge_lengths(size, rng):
+    # about as crowded as the middle of a game
+    occupied = rng.random((size,size)) < 0.15
+    opponent_city = rng.random((size,size)) < 0.05
+    nights_of_fuel_required = np.where(rng.random((size,size)) < 0.05, -1, 0)
+    return get_edge_lengths(occupied, opponent_city, nights_of_fuel_required)
+
+
+def benchmark(size, repeats, rng):
+    geometry = get_map_geometry(size, size)
+    edge_lengths = make_edge_lengths(size, rng)
+    targets = [tuple(xy) for xy in rng.integers(0, size, (repeats, 2)).tolist()]
+    # a homing move asks for the tiles next to the unit, here a few tiles from the target
+    sources = [(min(size-1, x+3), max(0, y-2)) for x,y in targets]
+
+    references = []
+    start = time.perf_counter()
+    for x,y in targets:
+        references.append(distance_to_target_with_tuples(edge_lengths, x, y))
+    timings = {"tuples": (time.perf_counter() - start) / repeats}
+
+    for kernel, search_class in PATH_SEARCH_KERNELS.items():
+        start = time.perf_counter()
+        for (x,y), (sx,sy) in zip(targets, sources):
+            search_class(geometry, (x,y), edge_lengths).get_distance(sy * size + sx)
+        timings[kernel + " near"] = (time.perf_counter() - start) / repeats
+
+        start = time.perf_counter()
+        searches = []
+        for x,y in targets:
+            search = search_class(geometry, (x,y), edge_lengths)
+            for tile in range(size * size):
+                search.get_distance(tile)
+            searches.append(search)
+        timings[kernel + " full"] = (time.perf_counter() - start) / repeats
+
+        for reference, search in zip(references, searches):
+            assert all(search.get_distance(y * size + x) == distance for (x,y), distance in reference.items()), kernel
+
+    return timings
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rng = np.random.default_rng(0)
+    columns = ["tuples"] + [kernel + mode for kernel in PATH_SEARCH_KERNELS for mode in [" near", " full"]]
+    print("size " + "".join(f"{column:>13}" for column in columns) + "   (ms per target)")
+    for size in [12, 16, 24, 32]:
+        timings = benchmark(size, repeats, rng)
+        print(f"{size:4d} " + "".join(f"{timings[column]*1000:13.3f}" for column in columns))
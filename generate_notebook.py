@@ -74,6 +74,15 @@ filenames = [
     "lux/game_objects.py",
     "lux/game_position.py",
     "lux/game_constants.py",
+    "lux/game_updates.py",
+    "lux/game_distance.py",
+    "lux/game_bitboard.py",
+    "lux/game_labels.py",
+    "lux/game_geometry.py",
+    "lux/game_stencil.py",
+    "lux/game_paths.py",
+    "lux/game_moves.py",
+    "lux/game_assignment.py",
     "lux/constants.py",
     "lux/annotate.py",
 ]
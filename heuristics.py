@@ -6,7 +6,8 @@ import time
 import numpy as np
 import builtins as __builtin__
 
-from typing import Dict
+from collections import defaultdict
+from typing import Dict, List, Tuple
 from lux import annotate
 from lux import game
 
@@ -15,25 +16,330 @@ from lux.game_map import Cell, RESOURCE_TYPES
 from lux.constants import Constants
 from lux.game_position import Position
 from lux.game_constants import GAME_CONSTANTS
+from lux.game_assignment import assign_targets
+from lux.game_distance import xy_sets_to_masks
 
 
-def find_best_cluster(game_state: Game, unit: Unit, DEBUG=False, explore=False, require_empty_target=False, ref_pos:Position=None):
+def _apply_to_values(function, values: np.ndarray) -> np.ndarray:
+    # apply a scalar function to each distinct value, the results are the floats that the scalar code computes
+    distinct, inverse = np.unique(values, return_inverse=True)
+    return np.array([function(value) for value in distinct.tolist()], dtype=float)[inverse.reshape(values.shape)]
+
+
+def _per_unit(values, dtype=int) -> np.ndarray:
+    # one value for each unit of a batch, shaped to broadcast against [unit,tile]
+    return np.array(values, dtype=dtype).reshape(-1, 1)
+
+
+def get_cluster_preferences(game_state: Game, unit: Unit, explore=False):
+
+    # only consider other cluster if the current cluster has more than one agent mining
+    consider_different_cluster = False
+    # must consider other cluster if the current cluster has more agent than tiles
+    consider_different_cluster_must = explore
+
+    # calculate how many resource tiles and how many units on the current cluster
+    current_leader = game_state.xy_to_resource_group_id.find(tuple(unit.pos))
+    units_mining_on_current_cluster = game_state.resource_leader_to_locating_units[current_leader] & game_state.resource_leader_to_targeting_units[current_leader]
+    resource_size_of_current_cluster = game_state.xy_to_resource_group_id.get_point(current_leader)
+    if game_state.distance_from_opponent_assets[unit.pos.y, unit.pos.x] > 10:
+        if resource_size_of_current_cluster > 1:
+            resource_size_of_current_cluster = resource_size_of_current_cluster//2
+
+    # only consider other cluster if another unit is targeting and mining in the current cluster
+    if len(units_mining_on_current_cluster - set([unit.id])) >= 1:
+        consider_different_cluster = True
+
+    # if you are in a barren field you must consider a different cluster
+    if tuple(unit.pos) not in game_state.convolved_collectable_tiles_xy_set:
+        consider_different_cluster_must = True
+
+    if len(units_mining_on_current_cluster) >= resource_size_of_current_cluster:
+        # must consider if you have more than enough workers in the current cluster
+        consider_different_cluster_must = True
+
+    return units_mining_on_current_cluster, consider_different_cluster, consider_different_cluster_must
+
+
+class ClusterTargetScores:
+    """
+    scores of every tile as the mission target of each unit of a batch, as used by find_best_cluster
+    cell_values is indexed [unit,y,x,channel], the four channels are compared lexicographically
+    the arrays are kept by [unit,tile] with the flat index tile = y*width+x, cell_values is a view of them
+
+    only the target bonus and the tiles that are already targeted depend on the missions, update refreshes them
+    for the clusters and the units whose mining or targeting units have changed, the rest is computed once
+    the batch is valid while the features of the game and the cargo and the travel range of the units are unchanged
+    """
+    def __init__(self, game_state: Game, units: List[Unit], explore=False, ref_pos: Position=None):
+        width, height = game_state.map_width, game_state.map_height
+        resource_groups = game_state.xy_to_resource_group_id
+        self.width, self.height = width, height
+        self.units = units
+        self.explore = explore
+        self.row_of_unit: Dict[str, int] = {unit.id: row for row, unit in enumerate(units)}
+        self.iteration_rank: np.ndarray = game_state.iteration_rank.ravel()
+
+        # Manhattan distances to every tile from each unit, as retrieve_distance without use_exact
+        distance_from_unit = game_state.map_geometry.distance_between_tiles[
+            [unit.pos.y for unit in units], [unit.pos.x for unit in units]].reshape(len(units), width * height)
+        distance = distance_from_unit
+
+        # the leader of the cluster of each tile, as a flat index
+        self.target_leader: np.ndarray = resource_groups.find_all(np.arange(width * height))
+        self.current_leaders = [resource_groups.find(tuple(unit.pos)) for unit in units]
+        self.in_current_cluster: np.ndarray = self.target_leader == _per_unit([y * width + x for x,y in self.current_leaders])
+
+        # what not to target, the targeted tiles are added by update
+        self.city_tiles = (game_state.opponent_city_tile_xy_set.to_matrix() | game_state.player_city_tile_xy_set.to_matrix()).ravel()
+
+        # allow multi targeting of uranium mines
+        self.multi_targetable = np.zeros(width * height, dtype=bool)
+        if game_state.player.researched_uranium_projected():
+            self.multi_targetable = ((game_state.convolved_uranium_exist_matrix != 0) &
+                                     (game_state.matrix_player_cities_nights_of_fuel_required_for_night > 0)).ravel()
+
+        candidates = np.ones(distance.shape, dtype=bool)
+        if ref_pos:
+            distance_from_ref_pos = game_state.map_geometry.distance_between_tiles[ref_pos.y, ref_pos.x].ravel()
+            candidates &= distance_from_ref_pos >= distance_from_unit
+
+        # cluster targeting logic
+        # every tile is in a cluster, a tile without resource is a cluster by itself
+        self.resource_size_of_target_cluster = resource_groups.get_array("points")[self.target_leader]
+        dist_from_player = resource_groups.get_array("dist_from_player")[self.target_leader]
+        dist_from_opponent = resource_groups.get_array("dist_from_opponent")[self.target_leader]
+
+        # if none of your units is targeting the cluster and definitely reachable
+        self.reachable = distance <= game_state.distance_from_opponent_assets.ravel()
+
+        # discourage targeting depending are you the closest unit to the resource
+        distance_bonus = np.maximum(1, game_state.distance_from_player_assets.ravel()) / np.maximum(1, distance)
+        self.not_further_than_others = ~(distance_bonus < 1)
+
+        # the squares and the logarithms are evaluated as in scalar code, so that the floats are the same
+        self.distance_bonus_squared = _apply_to_values(lambda value: value**2, distance_bonus)
+        self.distance_bonus_squared_must = _apply_to_values(lambda value: value**2, np.maximum(1/2, distance_bonus))
+        self.closest = distance_bonus == 1
+
+        # travel penalty
+        self.travel_penalty = _apply_to_values(lambda value: math.log(4 + value, 2), dist_from_player)
+
+        # if targeted cluster is much closer to enemy, do not target if cannot survive the night
+        # resources is required for invasion
+        self.night_risk = _per_unit([unit.night_turn_survivable < 10 for unit in units], dtype=bool) & \
+                          (game_state.distance_from_opponent_assets.ravel() + 5 < dist_from_player)
+
+        # slightly discourage targeting clusters closer to enemy
+        self.closer_to_opponent = dist_from_opponent < dist_from_player
+
+        # if targeting same cluster do not move more than five
+        candidates &= ~(self.in_current_cluster & (distance > 5))
+
+        # only target cells where you can collect resources
+        candidates &= game_state.convolved_collectable_tiles_matrix_projected.ravel() != 0
+        candidates &= ~(_per_unit([unit.night_turn_survivable < 10 for unit in units], dtype=bool) &
+                        (game_state.convolved_collectable_tiles_matrix.ravel() == 0))
+
+        # do not plan overnight missions if you are the only unit mining, applied once the mining units are known
+        self.overnight = _per_unit([tuple(unit.pos) in game_state.convolved_collectable_tiles_xy_set for unit in units], dtype=bool) & \
+                         (distance > 15)
+
+        # estimate target score
+        candidates &= distance <= _per_unit([unit.travel_range for unit in units])
+        cell_values = [None,
+                       - game_state.distance_from_floodfill_by_empty_tile.ravel(),
+                       - game_state.distance_from_resource_median.ravel()
+                       - distance - game_state.distance_from_opponent_assets.ravel()
+                       - distance + game_state.distance_from_player_unit_median.ravel(),
+                       - distance - game_state.opponent_units_matrix.ravel() * 2]
+
+        # penalty on parameter preference
+        # if not collectable and not buildable, penalise
+        cell_values[1] = np.where(~game_state.collectable_tiles_xy_set.to_matrix().ravel() & ~game_state.buildable_tile_xy_set.to_matrix().ravel(),
+                                  cell_values[1] - 1, cell_values[1])
+
+        # prefer to mine advanced resources faster
+        cargo_space = _per_unit([unit.get_cargo_space_left() > 8 for unit in units])
+        if game_state.player.researched_coal_projected():
+            cell_values[1] = cell_values[1] + cargo_space * 2*game_state.convolved_coal_exist_matrix.ravel()
+        if game_state.player.researched_uranium_projected():
+            cell_values[1] = cell_values[1] + cargo_space * 2*game_state.convolved_uranium_exist_matrix.ravel()
+
+        # if mining advanced resource, stand your ground unless there is a direct path
+        mining_advanced = _per_unit([game_state.convolved_coal_exist_matrix[unit.pos.y,unit.pos.x] or
+                                     game_state.convolved_uranium_exist_matrix[unit.pos.y,unit.pos.x] for unit in units], dtype=bool)
+        candidates &= ~(mining_advanced & (distance > distance_from_unit))
+
+        # discourage if the target is one unit closer to the enemy, in the early game
+        # specific case to avoid this sort of targeting (A -> X)
+        #    X
+        # WABW
+        # WWWW
+        if game_state.turn < 80:
+            cell_values[2] = np.where((game_state.distance_from_opponent_assets + 1 == game_state.distance_from_player_units).ravel(),
+                                      cell_values[2] - 2, cell_values[2])
+
+        # for first target prefer B over A
+        #   X
+        # BWWW
+        #  WWW
+        #  AX
+        if game_state.turn < 1:
+            cell_values[2] = np.where(((game_state.distance_from_opponent_assets == 1) & (game_state.distance_from_player_assets > 2)).ravel(),
+                                      cell_values[2] - 2, cell_values[2])
+
+        # discourage if you are in the citytile, and you are targeting the location beside you with one wood side
+        # specific case to avoid this sort of targeting (A -> X), probably encourage (A -> Z) or (A -> Y)
+        #
+        #   AX
+        #  ZWWY
+        cell_values[2] = np.where(_per_unit([tuple(unit.pos) in game_state.player_city_tile_xy_set for unit in units], dtype=bool) &
+                                  (distance_from_unit == 1) &
+                                  ((game_state.convolved_wood_exist_matrix == 1) & (game_state.resource_collection_rate == 20) &
+                                   (game_state.distance_from_opponent_units > 2)).ravel(),
+                                  cell_values[2] - 5, cell_values[2])
+
+        # if more than 20 uranium do not target a wood cluster so that it can home
+        self.wood_cluster_avoided = _per_unit([unit.cargo.uranium > 20 for unit in units], dtype=bool) & \
+                                    (game_state.convolved_wood_exist_matrix*20 == game_state.resource_collection_rate).ravel()
+
+        self.static_candidates = candidates
+        self._cell_values = np.empty(distance.shape + (4,))
+        for channel in range(1, 4):
+            self._cell_values[..., channel] = cell_values[channel]
+        self.cell_values: np.ndarray = self._cell_values.reshape(len(units), height, width, 4)
+
+        # the parts that depend on the missions
+        self.targets_snapshot = None
+        self.excluded = self.city_tiles
+        self.units_of_leader = np.zeros(width * height, dtype=int)
+        self.units_targeting_or_mining_on_target_cluster = np.zeros(width * height, dtype=int)
+        self.units_mining = np.zeros(len(units), dtype=int)
+        self.consider_different_cluster = np.zeros((len(units), 1), dtype=bool)
+        self.consider_different_cluster_must = np.zeros((len(units), 1), dtype=bool)
+        self.target_bonus = np.empty(distance.shape)
+        self.update(game_state)
+
+    @staticmethod
+    def get_targets_snapshot(game_state: Game):
+        # the mission targets that the scores depend on
+        return (frozenset(game_state.targeted_xy_set), frozenset(game_state.targeted_for_building_xy_set),
+                {leader: frozenset(units) for leader, units in game_state.resource_leader_to_locating_units.items() if units},
+                {leader: frozenset(units) for leader, units in game_state.resource_leader_to_targeting_units.items() if units})
+
+    def update(self, game_state: Game):
+        # refresh the parts that depend on the missions, if the targets have changed since the last update
+        snapshot = self.get_targets_snapshot(game_state)
+        if snapshot == self.targets_snapshot:
+            return
+        targeted_xy_set, targeted_for_building_xy_set, locating_units, targeting_units = snapshot
+        if self.targets_snapshot is None:
+            changed_leaders = set(locating_units) | set(targeting_units)
+        else:
+            _, _, previous_locating_units, previous_targeting_units = self.targets_snapshot
+            changed_leaders = {leader for leader in set(locating_units) | set(targeting_units) |
+                               set(previous_locating_units) | set(previous_targeting_units)
+                               if locating_units.get(leader) != previous_locating_units.get(leader) or
+                                  targeting_units.get(leader) != previous_targeting_units.get(leader)}
+        is_first_update = self.targets_snapshot is None
+        self.targets_snapshot = snapshot
+
+        # what not to target
+        targeted_for_building, targeted = xy_sets_to_masks([targeted_for_building_xy_set, targeted_xy_set], self.width, self.height)
+        self.excluded = self.city_tiles | targeted_for_building.ravel() | (targeted.ravel() & ~self.multi_targetable)
+
+        # number of units that are mining or targeting the cluster of each tile
+        for x,y in changed_leaders:
+            self.units_of_leader[y * self.width + x] = len(locating_units.get((x,y), frozenset()) | targeting_units.get((x,y), frozenset()))
+        units_on_target_cluster = self.units_of_leader[self.target_leader]
+        changed_tiles = np.nonzero(units_on_target_cluster != self.units_targeting_or_mining_on_target_cluster)[0]
+        self.units_targeting_or_mining_on_target_cluster = units_on_target_cluster
+
+        # the units on a changed cluster may reconsider other clusters
+        changed_rows = []
+        for row, (unit, current_leader) in enumerate(zip(self.units, self.current_leaders)):
+            if current_leader not in changed_leaders and not is_first_update:
+                continue
+            units_mining_on_current_cluster, consider_different_cluster, consider_different_cluster_must = \
+                get_cluster_preferences(game_state, unit, self.explore)
+            self.units_mining[row] = len(units_mining_on_current_cluster)
+            if (consider_different_cluster, consider_different_cluster_must) != \
+               (self.consider_different_cluster[row,0], self.consider_different_cluster_must[row,0]):
+                self.consider_different_cluster[row] = consider_different_cluster
+                self.consider_different_cluster_must[row] = consider_different_cluster_must
+                changed_rows.append(row)
+
+        if is_first_update:
+            self._set_target_bonus(slice(None), slice(None))
+            return
+        if len(changed_tiles):
+            self._set_target_bonus(slice(None), changed_tiles)
+        if changed_rows:
+            self._set_target_bonus(np.array(changed_rows), slice(None))
+
+    def _set_target_bonus(self, rows, tiles):
+        # target bonus depends on how many resource tiles and how many units that are mining or targeting
+        # it should have the same value for the entire cluster
+        units_on_cluster = self.units_targeting_or_mining_on_target_cluster[tiles]
+        resource_size = self.resource_size_of_target_cluster[tiles]
+        must = self.consider_different_cluster_must[rows]
+        in_current_cluster = self.in_current_cluster[rows][:, tiles]
+
+        target_bonus = resource_size / (1 + units_on_cluster)
+        target_bonus = np.where(units_on_cluster > resource_size, target_bonus * 0.1, target_bonus)
+        target_bonus = np.where((units_on_cluster == 0) & self.reachable[rows][:, tiles], target_bonus * 10, target_bonus)
+        target_bonus = target_bonus * np.where(must, self.distance_bonus_squared_must[rows][:, tiles],
+                                               self.distance_bonus_squared[rows][:, tiles])
+        target_bonus = np.where(self.closest[rows][:, tiles], target_bonus * 10, target_bonus)
+        target_bonus = target_bonus / self.travel_penalty[tiles]
+        target_bonus = np.where(self.night_risk[rows][:, tiles], target_bonus * 0.01, target_bonus)
+        target_bonus = np.where(self.closer_to_opponent[tiles], target_bonus * 0.9, target_bonus)
+        target_bonus = np.where(self.consider_different_cluster[rows] | must, target_bonus, 1.0)
+
+        # enforce targeting of other clusters
+        target_bonus = np.where(must & ~in_current_cluster, target_bonus * 10, target_bonus)
+        target_bonus = np.where(~must & in_current_cluster, target_bonus * 2, target_bonus)
+
+        self.target_bonus[rows, tiles] = target_bonus
+        self._cell_values[rows, tiles, 0] = np.where(self.wood_cluster_avoided[rows][:, tiles], -1, target_bonus)
+
+    def get_candidates(self, row, require_empty_target=False) -> np.ndarray:
+        # the tiles that the unit may target, indexed [y,x]
+        candidates = self.static_candidates[row] & ~self.excluded
+        if self.units_mining[row] <= 1:
+            candidates &= ~self.overnight[row]
+        if require_empty_target:
+            if self.units_mining[row] <= 2:
+                candidates[:] = False
+            if self.consider_different_cluster[row,0] or self.consider_different_cluster_must[row,0]:
+                candidates &= (self.units_targeting_or_mining_on_target_cluster == 0) & self.not_further_than_others[row]
+        return candidates.reshape(self.height, self.width)
+
+    def get_ranked_targets(self, row, better_than: List, limit) -> List[Tuple[List, int]]:
+        # the cell values and the tiles of the best candidates of the unit that are better than the given cell value
+        # best first, the first tile in the iteration order wins a tie as in find_best_cluster
+        tiles = np.nonzero(self.get_candidates(row).ravel())[0]
+        cell_values = self._cell_values[row, tiles]
+        channels = [cell_values[:, channel] for channel in reversed(range(cell_values.shape[1]))]
+        ranked_targets = []
+        for i in np.lexsort([-self.iteration_rank[tiles]] + channels)[::-1][:limit].tolist():
+            cell_value = cell_values[i].tolist()
+            if not cell_value > better_than:
+                break
+            ranked_targets.append((cell_value, int(tiles[i])))
+        return ranked_targets
+
+
+def get_initial_cell_value(game_state: Game, unit: Unit, DEBUG=False) -> Tuple[List, List[str]]:
+    # the cell value that a target has to beat, it is large if the unit should stay
 
     if DEBUG: print = __builtin__.print
     else: print = lambda *args: None
 
-    # for debugging
-    score_matrix_wrt_pos = game_state.init_matrix()
-
-    # default response is not to move
-    best_position = unit.pos
     best_cell_value = [0,0,0,0]
     cluster_annotation = []
 
-    if time.time() - game_state.compute_start_time > 3:
-        # running out of time
-        return best_position, best_cell_value, cluster_annotation
-
     # if at night, if near enemy or almost dawn, if city is going to die, if staying can keep the city alive
     if not game_state.is_day_time:
         cityid = game_state.map.get_cityid_of_cell(unit.pos.x, unit.pos.y)
@@ -86,236 +392,137 @@ def find_best_cluster(game_state: Game, unit: Unit, DEBUG=False, explore=False,
             annotation = annotate.text(unit.pos.x, unit.pos.y, "SX")
             cluster_annotation.append(annotation)
 
-    # only consider other cluster if the current cluster has more than one agent mining
-    consider_different_cluster = False
-    # must consider other cluster if the current cluster has more agent than tiles
-    consider_different_cluster_must = explore
+    return best_cell_value, cluster_annotation
 
-    # calculate how many resource tiles and how many units on the current cluster
-    current_leader = game_state.xy_to_resource_group_id.find(tuple(unit.pos))
-    units_mining_on_current_cluster = game_state.resource_leader_to_locating_units[current_leader] & game_state.resource_leader_to_targeting_units[current_leader]
-    resource_size_of_current_cluster = game_state.xy_to_resource_group_id.get_point(current_leader)
-    if game_state.distance_from_opponent_assets[unit.pos.y, unit.pos.x] > 10:
-        if resource_size_of_current_cluster > 1:
-            resource_size_of_current_cluster = resource_size_of_current_cluster//2
 
-    # only consider other cluster if another unit is targeting and mining in the current cluster
-    if len(units_mining_on_current_cluster - set([unit.id])) >= 1:
-        consider_different_cluster = True
-
-    # if you are in a barren field you must consider a different cluster
-    if tuple(unit.pos) not in game_state.convolved_collectable_tiles_xy_set:
-        consider_different_cluster_must = True
-
-    if len(units_mining_on_current_cluster) >= resource_size_of_current_cluster:
-        # must consider if you have more than enough workers in the current cluster
-        consider_different_cluster_must = True
-
-    print("finding best cluster for", unit.id, unit.pos, consider_different_cluster, consider_different_cluster_must)
+def get_cluster_annotations(scores: ClusterTargetScores, unit: Unit, candidates: np.ndarray, best_cell_value: List) -> List[str]:
+    # the best candidate of each cluster, annotated if the best cell value is more than the target bonus of the current cluster
+    cluster_annotation = []
+    row = scores.row_of_unit[unit.id]
+    ys, xs = np.nonzero(candidates)
+    cell_values = scores.cell_values[row, ys, xs]
+    channels = [cell_values[:, channel] for channel in reversed(range(cell_values.shape[1]))]
 
-    best_citytile_of_cluster: Dict = dict()
+    # annotate if target bonus is more than one
     target_bonus_for_current_cluster_logging = -999
+    in_current_cluster = scores.in_current_cluster[row][ys * scores.width + xs]
+    if in_current_cluster.any():
+        target_bonus_for_current_cluster_logging = max(target_bonus_for_current_cluster_logging,
+                                                       scores.target_bonus[row][ys * scores.width + xs][in_current_cluster].max())
 
-    for y in game_state.y_iteration_order:
-        for x in game_state.x_iteration_order:
-
-            # what not to target
-            if (x,y) in game_state.targeted_for_building_xy_set:
-                continue
-            if (x,y) in game_state.opponent_city_tile_xy_set:
-                continue
-            if (x,y) in game_state.player_city_tile_xy_set:
-                continue
-
-            if ref_pos:
-                if abs(ref_pos.x - x) + abs(ref_pos.y - y) < abs(unit.pos.x - x) + abs(unit.pos.y - y):
-                    continue
-
-            # allow multi targeting of uranium mines
-            if game_state.convolved_uranium_exist_matrix[y,x] == 0 or \
-                not game_state.player.researched_uranium_projected() or \
-                    game_state.matrix_player_cities_nights_of_fuel_required_for_night[y,x] <= 0:
-                if (x,y) in game_state.targeted_xy_set:
-                    continue
-
-            if require_empty_target and len(units_mining_on_current_cluster) <= 2:
-                continue
-
-            distance = game_state.retrieve_distance(unit.pos.x, unit.pos.y, x, y)
-
-            # cluster targeting logic
-
-            # target bonus should have the same value for the entire cluster
-            target_bonus = 1
-            target_leader = game_state.xy_to_resource_group_id.find((x,y))
-            if consider_different_cluster or consider_different_cluster_must:
-                # if the target is a cluster and not the current cluster
-                if target_leader:
-
-                    units_targeting_or_mining_on_target_cluster = \
-                        game_state.resource_leader_to_locating_units[target_leader] | \
-                        game_state.resource_leader_to_targeting_units[target_leader]
-
-                    if require_empty_target and units_targeting_or_mining_on_target_cluster:
-                        continue
-                    resource_size_of_target_cluster = game_state.xy_to_resource_group_id.get_point(target_leader)
-
-                    # target bonus depends on how many resource tiles and how many units that are mining or targeting
-                    target_bonus = resource_size_of_target_cluster/\
-                                   (1 + len(units_targeting_or_mining_on_target_cluster))
-
-                    # avoid targeting overpopulated clusters
-                    if len(units_targeting_or_mining_on_target_cluster) > resource_size_of_target_cluster:
-                        target_bonus = target_bonus * 0.1
+    if best_cell_value[0] > target_bonus_for_current_cluster_logging > -999:
+        # the best tile of each cluster, compared by the cell value and then by the position
+        ascending = np.lexsort([ys, xs] + channels)
+        _, last_of_cluster = np.unique(scores.target_leader[ys * scores.width + xs][ascending][::-1], return_index=True)
+        for i in ascending[np.sort(len(ascending) - 1 - last_of_cluster)[:10]].tolist():
+            x, y = int(xs[i]), int(ys[i])
+            annotation = annotate.text(x,y,f"{int(cell_values[i,0])}")
+            cluster_annotation.append(annotation)
+            annotation = annotate.line(unit.pos.x,unit.pos.y,x,y)
+            cluster_annotation.append(annotation)
+    return cluster_annotation
 
-                    # if none of your units is targeting the cluster and definitely reachable
-                    if len(units_targeting_or_mining_on_target_cluster) == 0:
-                        if distance <= game_state.distance_from_opponent_assets[y,x]:
-                            target_bonus = target_bonus * 10
 
-                    # discourage targeting depending are you the closest unit to the resource
-                    distance_bonus = max(1,game_state.distance_from_player_assets[y,x])/max(1,distance)
+def find_best_cluster(game_state: Game, unit: Unit, DEBUG=False, explore=False, require_empty_target=False, ref_pos:Position=None,
+                      scores: ClusterTargetScores=None):
 
-                    if require_empty_target and distance_bonus < 1:
-                        continue
+    if DEBUG: print = __builtin__.print
+    else: print = lambda *args: None
 
-                    if consider_different_cluster_must:
-                        distance_bonus = max(1/2, distance_bonus)
+    # for debugging
+    score_matrix_wrt_pos = game_state.init_matrix()
 
-                    target_bonus = target_bonus * distance_bonus**2
+    # default response is not to move
+    best_position = unit.pos
+    best_cell_value = [0,0,0,0]
+    cluster_annotation = []
 
-                    if distance_bonus == 1:
-                        # extra bonus if you are closest to the target
-                        target_bonus = target_bonus * 10
+    if time.time() - game_state.compute_start_time > 3:
+        # running out of time
+        return best_position, best_cell_value, cluster_annotation
 
-                    # travel penalty
-                    target_bonus = target_bonus / math.log(4 + game_state.xy_to_resource_group_id.get_dist_from_player((x,y),), 2)
+    best_cell_value, cluster_annotation = get_initial_cell_value(game_state, unit, DEBUG=DEBUG)
 
-                    # if targeted cluster is much closer to enemy, do not target if cannot survive the night
-                    # resources is required for invasion
-                    if game_state.distance_from_opponent_assets[y,x] + 5 < \
-                       game_state.xy_to_resource_group_id.get_dist_from_player((x,y),):
-                        if unit.night_turn_survivable < 10:
-                            target_bonus = target_bonus * 0.01
+    if scores is None or unit.id not in scores.row_of_unit:
+        scores = ClusterTargetScores(game_state, [unit], explore=explore, ref_pos=ref_pos)
+    scores.update(game_state)
+    row = scores.row_of_unit[unit.id]
 
-                    # slightly discourage targeting clusters closer to enemy
-                    if game_state.xy_to_resource_group_id.get_dist_from_opponent((x,y),) < \
-                       game_state.xy_to_resource_group_id.get_dist_from_player((x,y),):
-                        target_bonus = target_bonus * 0.9
+    print("finding best cluster for", unit.id, unit.pos, scores.consider_different_cluster[row,0], scores.consider_different_cluster_must[row,0])
 
-            if target_leader and target_leader == current_leader:
-                # if targeting same cluster do not move more than five
-                if distance > 5:
-                    continue
+    candidates = scores.get_candidates(row, require_empty_target)
+    ys, xs = np.nonzero(candidates)
+    cell_values = scores.cell_values[row, ys, xs]
+    channels = [cell_values[:, channel] for channel in reversed(range(cell_values.shape[1]))]
 
-            if consider_different_cluster_must and target_leader != current_leader:
-                # enforce targeting of other clusters
-                target_bonus = target_bonus * 10
+    # update best target, the first tile in the iteration order wins a tie
+    if len(xs):
+        best = np.lexsort([-game_state.iteration_rank[ys, xs]] + channels)[-1]
+        cell_value = cell_values[best].tolist()
+        if cell_value > best_cell_value:
+            best_cell_value = cell_value
+            best_position = Position(int(xs[best]), int(ys[best]))
 
-            if not consider_different_cluster_must and target_leader == current_leader:
-                target_bonus = target_bonus * 2
+    cluster_annotation.extend(get_cluster_annotations(scores, unit, candidates, best_cell_value))
 
-            # only target cells where you can collect resources
-            if game_state.convolved_collectable_tiles_matrix_projected[y,x] == 0:
-                continue
+    # for debugging
+    score_matrix_wrt_pos[candidates] = scores.cell_values[row][candidates, 2]
+    game_state.heuristics_from_positions[tuple(unit.pos)] = score_matrix_wrt_pos
 
-            if unit.night_turn_survivable < 10:
-                if game_state.convolved_collectable_tiles_matrix[y,x] == 0:
-                    continue
+    return best_position, best_cell_value, cluster_annotation
 
-            # identation to retain commit history
-            if True:
-                # do not plan overnight missions if you are the only unit mining
-                if tuple(unit.pos) in game_state.convolved_collectable_tiles_xy_set:
-                    if len(units_mining_on_current_cluster) <= 1 and distance > 15:
-                        continue
-
-                # estimate target score
-                if distance <= unit.travel_range:
-                    cell_value = [target_bonus,
-                                  - game_state.distance_from_floodfill_by_empty_tile[y,x],
-                                  - game_state.distance_from_resource_median[y,x]
-                                  - distance - game_state.distance_from_opponent_assets[y,x]
-                                  - distance + game_state.distance_from_player_unit_median[y,x],
-                                  - distance - game_state.opponent_units_matrix[y,x] * 2]
-
-                    # penalty on parameter preference
-                    # if not collectable and not buildable, penalise
-                    if (x,y) not in game_state.collectable_tiles_xy_set and (x,y) not in game_state.buildable_tile_xy_set:
-                        cell_value[1] -= 1
-
-                    # prefer to mine advanced resources faster
-                    if unit.get_cargo_space_left() > 8:
-                        if game_state.player.researched_coal_projected():
-                            cell_value[1] += 2*game_state.convolved_coal_exist_matrix[y,x]
-                        if game_state.player.researched_uranium_projected():
-                            cell_value[1] += 2*game_state.convolved_uranium_exist_matrix[y,x]
-
-                    # if mining advanced resource, stand your ground unless there is a direct path
-                    if game_state.convolved_coal_exist_matrix[unit.pos.y,unit.pos.x] or game_state.convolved_uranium_exist_matrix[unit.pos.y,unit.pos.x]:
-                        if distance > abs(unit.pos.x - x) + abs(unit.pos.y - y):
-                            continue
-
-                    # discourage if the target is one unit closer to the enemy, in the early game
-                    # specific case to avoid this sort of targeting (A -> X)
-                    #    X
-                    # WABW
-                    # WWWW
-                    if game_state.distance_from_opponent_assets[y,x] + 1 == game_state.distance_from_player_units[y,x]:
-                        if game_state.turn < 80:
-                            cell_value[2] -= 2
-
-                    # for first target prefer B over A
-                    #   X
-                    # BWWW
-                    #  WWW
-                    #  AX
-                    if game_state.distance_from_opponent_assets[y,x] == 1 and game_state.distance_from_player_assets[y,x] > 2:
-                        if game_state.turn < 1:
-                            cell_value[2] -= 2
-
-                    # discourage if you are in the citytile, and you are targeting the location beside you with one wood side
-                    # specific case to avoid this sort of targeting (A -> X), probably encourage (A -> Z) or (A -> Y)
-                    #
-                    #   AX
-                    #  ZWWY
-                    if tuple(unit.pos) in game_state.player_city_tile_xy_set:
-                        if Position(x,y) - unit.pos == 1:
-                            if game_state.convolved_wood_exist_matrix[y,x] == 1 and game_state.resource_collection_rate[y,x] == 20:
-                                if game_state.distance_from_opponent_units[y,x] > 2:
-                                    cell_value[2] -= 5
-
-
-                    # if more than 20 uranium do not target a wood cluster so that it can home
-                    if unit.cargo.uranium > 20:
-                        if game_state.convolved_wood_exist_matrix[y,x]*20 == game_state.resource_collection_rate[y,x]:
-                            cell_value[0] = -1
-
-                    # for debugging
-                    score_matrix_wrt_pos[y,x] = cell_value[2]
-
-                    # update best target
-                    if cell_value > best_cell_value:
-                        best_cell_value = cell_value
-                        best_position = Position(x,y)
-
-                    if target_leader not in best_citytile_of_cluster:
-                        best_citytile_of_cluster[target_leader] = (cell_value,x,y)
-                    if (cell_value,x,y) > best_citytile_of_cluster[target_leader]:
-                        best_citytile_of_cluster[target_leader] = (cell_value,x,y)
-
-                    if target_leader == current_leader:
-                        target_bonus_for_current_cluster_logging = max(target_bonus_for_current_cluster_logging, target_bonus)
 
-    # annotate if target bonus is more than one
-    if best_cell_value[0] > target_bonus_for_current_cluster_logging > -999:
-        for cell_value,x,y in sorted(best_citytile_of_cluster.values())[:10]:
-            annotation = annotate.text(x,y,f"{int(cell_value[0])}")
-            cluster_annotation.append(annotation)
-            annotation = annotate.line(unit.pos.x,unit.pos.y,x,y)
-            cluster_annotation.append(annotation)
+def assign_cluster_targets(game_state: Game, units: List[Unit], scores: ClusterTargetScores, limit=16, DEBUG=False) -> Dict[str, Tuple]:
+    # plan the targets of the units together, rather than one unit after the other with find_best_cluster
+    # each unit ranks its best tiles, the assignment minimises the sum of the ranks of the tiles taken
+    # a tile is taken by one unit, unless it is a uranium mine that can be targeted by many units
+    # a cluster takes as many units as its resource points, less the other units that are mining or targeting it
+    # returns the best position, the best cell value and the annotations of each unit, as find_best_cluster
 
-    # for debugging
-    game_state.heuristics_from_positions[tuple(unit.pos)] = score_matrix_wrt_pos
+    if DEBUG: print = __builtin__.print
+    else: print = lambda *args: None
 
-    return best_position, best_cell_value, cluster_annotation
+    assignment = {unit.id: (unit.pos, [0,0,0,0], []) for unit in units}
+    if time.time() - game_state.compute_start_time > 3:
+        # running out of time
+        return assignment
+
+    scores.update(game_state)
+    width = game_state.map_width
+    points = game_state.xy_to_resource_group_id.get_array("points")
+
+    # the planned units are not targeting yet, they only count for the cluster where they are mining
+    planned_units_of_leader: Dict[int, int] = defaultdict(int)
+    preferences, ranked_units, cell_value_of_target = [], [], {}
+    for unit in units:
+        best_cell_value, cluster_annotation = get_initial_cell_value(game_state, unit, DEBUG=DEBUG)
+        assignment[unit.id] = (unit.pos, best_cell_value, cluster_annotation)
+        row = scores.row_of_unit[unit.id]
+        x,y = scores.current_leaders[row]
+        if unit.id in game_state.resource_leader_to_locating_units.get((x,y), set()):
+            planned_units_of_leader[y * width + x] += 1
+
+        ranked_targets = scores.get_ranked_targets(row, best_cell_value, limit)
+        if ranked_targets:
+            preferences.append([(rank, tile) for rank, (_, tile) in enumerate(ranked_targets)])
+            ranked_units.append(unit)
+            cell_value_of_target.update({(unit.id, tile): cell_value for cell_value, tile in ranked_targets})
+
+    group_of_target = {tile: int(scores.target_leader[tile]) for choices in preferences for _, tile in choices}
+    target_capacity = {tile: 1 for tile in group_of_target if not scores.multi_targetable[tile]}
+    group_capacity = {leader: max(0, int(points[leader]) - int(scores.units_of_leader[leader]) + planned_units_of_leader[leader])
+                      for leader in set(group_of_target.values()) if points[leader] > 0}
+
+    for unit, tile in zip(ranked_units, assign_targets(preferences, limit, group_of_target, target_capacity, group_capacity)):
+        if tile is None:
+            print("no target assigned", unit.id, unit.pos)
+            continue
+        _, _, cluster_annotation = assignment[unit.id]
+        assignment[unit.id] = (Position(tile % width, tile // width), cell_value_of_target[unit.id, tile], cluster_annotation)
+
+    for unit in units:
+        best_position, best_cell_value, cluster_annotation = assignment[unit.id]
+        candidates = scores.get_candidates(scores.row_of_unit[unit.id])
+        cluster_annotation = cluster_annotation + get_cluster_annotations(scores, unit, candidates, best_cell_value)
+        assignment[unit.id] = (best_position, best_cell_value, cluster_annotation)
+    return assignment
@@ -6,6 +6,7 @@ import time
 from typing import Set
 from lux import annotate
 from lux.game import Game, Observation, Unit
+from lux.game_updates import ParsedUpdates, parse_updates
 import builtins as __builtin__
 import random
 
@@ -17,69 +18,51 @@ model = torch.jit.load(f'{path}/model.pth')
 model.eval()
 
 
-def make_input(obs: Observation, unit_id: str):
+def assign_last_written(b, idx, x, y, values):
+    # b[idx, x, y] = values, where the last row wins if the same element is written more than once
+    flat_index = np.ravel_multi_index((idx, x, y), b.shape)
+    _, reversed_first = np.unique(flat_index[::-1], return_index=True)
+    last_written = len(flat_index) - 1 - reversed_first
+    b[idx[last_written], x[last_written], y[last_written]] = values[last_written]
+
+
+def make_shared_input(obs: Observation, updates: ParsedUpdates):
+    # the input planes that are the same for every unit, with every unit placed as an other unit
     width, height = obs['width'], obs['height']
     x_shift = (32 - width) // 2
     y_shift = (32 - height) // 2
-    cities = {}
 
     b = np.zeros((20, 32, 32), dtype=np.float32)
 
-    for update in obs['updates']:
-        strs = update.split(' ')
-        input_identifier = strs[0]
-
-        if input_identifier == 'u':
-            x = int(strs[4]) + x_shift
-            y = int(strs[5]) + y_shift
-            wood = int(strs[7])
-            coal = int(strs[8])
-            uranium = int(strs[9])
-            if unit_id == strs[3]:
-                # Position and Cargo
-                b[:2, x, y] = (
-                    1,
-                    (wood + coal + uranium) / 100
-                )
-            else:
-                # Units
-                team = int(strs[2])
-                cooldown = float(strs[6])
-                idx = 2 + (team - obs['player']) % 2 * 3
-                b[idx:idx + 3, x, y] = (
-                    1,
-                    cooldown / 6,
-                    (wood + coal + uranium) / 100
-                )
-        elif input_identifier == 'ct':
-            # CityTiles
-            team = int(strs[1])
-            city_id = strs[2]
-            x = int(strs[3]) + x_shift
-            y = int(strs[4]) + y_shift
-            idx = 8 + (team - obs['player']) % 2 * 2
-            b[idx:idx + 2, x, y] = (
-                1,
-                cities[city_id]
-            )
-        elif input_identifier == 'r':
-            # Resources
-            r_type = strs[1]
-            x = int(strs[2]) + x_shift
-            y = int(strs[3]) + y_shift
-            amt = int(float(strs[4]))
-            b[{'wood': 12, 'coal': 13, 'uranium': 14}[r_type], x, y] = amt / 800
-        elif input_identifier == 'rp':
-            # Research Points
-            team = int(strs[1])
-            rp = int(strs[2])
-            b[15 + (team - obs['player']) % 2, :] = min(rp, 200) / 200
-        elif input_identifier == 'c':
-            # Cities
-            city_id = strs[2]
-            fuel = float(strs[3])
-            lightupkeep = float(strs[4])
-            cities[city_id] = min(fuel / lightupkeep, 10) / 10
+    # Units
+    units = updates.units
+    x = units['x'].astype(int) + x_shift
+    y = units['y'].astype(int) + y_shift
+    idx = 2 + (units['team'].astype(int) - obs['player']) % 2 * 3
+    cargo = (units['wood'] + units['coal'] + units['uranium']) / 100
+    for offset, values in enumerate([np.ones(len(units)), units['cooldown'] / 6, cargo]):
+        assign_last_written(b, idx + offset, x, y, values)
+
+    # CityTiles
+    cities = {city_id: min(fuel / lightupkeep, 10) / 10 for _, city_id, fuel, lightupkeep in updates.cities.tolist()}
+    citytiles = updates.citytiles
+    x = citytiles['x'].astype(int) + x_shift
+    y = citytiles['y'].astype(int) + y_shift
+    idx = 8 + (citytiles['team'].astype(int) - obs['player']) % 2 * 2
+    city_values = np.array([cities[city_id] for city_id in citytiles['cityid'].tolist()])
+    assign_last_written(b, idx, x, y, np.ones(len(citytiles)))
+    assign_last_written(b, idx + 1, x, y, city_values)
+
+    # Resources
+    resources = updates.resources
+    x = resources['x'].astype(int) + x_shift
+    y = resources['y'].astype(int) + y_shift
+    idx = np.array([{'wood': 12, 'coal': 13, 'uranium': 14}[r_type] for r_type in resources['type'].tolist()], dtype=int)
+    assign_last_written(b, idx, x, y, resources['amount'] / 800)
+
+    # Research Points
+    for team, rp in updates.research.tolist():
+        b[15 + (team - obs['player']) % 2, :] = min(rp, 200) / 200
 
     # Day/Night Cycle
     b[17, :] = obs['step'] % 40 / 40
@@ -91,6 +74,48 @@ def make_input(obs: Observation, unit_id: str):
     return b
 
 
+# the shared input is computed once per turn and copied for every unit
+shared_input_cache = {"updates": None, "input": None}
+
+
+def make_input(obs: Observation, unit_id: str, updates: ParsedUpdates = None):
+    if updates is None:
+        updates = parse_updates(obs['updates'])
+
+    if shared_input_cache["updates"] is not updates:
+        shared_input_cache["updates"] = updates
+        shared_input_cache["input"] = make_shared_input(obs, updates)
+    b = shared_input_cache["input"].copy()
+
+    x_shift = (32 - obs['width']) // 2
+    y_shift = (32 - obs['height']) // 2
+    units = updates.units
+    is_unit = units['id'] == unit_id
+    if not is_unit.any():
+        return b
+
+    # Position and Cargo
+    unittype, team, _, x, y, cooldown, wood, coal, uranium = units[is_unit].tolist()[-1]
+    x, y = x + x_shift, y + y_shift
+    b[:2, x, y] = (
+        1,
+        (wood + coal + uranium) / 100
+    )
+
+    # the unit is not one of the other units, replace the other units on its cell
+    b[2:8, x, y] = 0
+    sharing_cell = (units['x'] + x_shift == x) & (units['y'] + y_shift == y) & ~is_unit
+    for _, team, _, _, _, cooldown, wood, coal, uranium in units[sharing_cell].tolist():
+        idx = 2 + (team - obs['player']) % 2 * 3
+        b[idx:idx + 3, x, y] = (
+            1,
+            cooldown / 6,
+            (wood + coal + uranium) / 100
+        )
+
+    return b
+
+
 def probabilistic_sort(logits):
     probs = np.exp(logits)/np.sum(np.exp(logits))
     pool = [(i,x) for i,x in enumerate(probs)]
@@ -182,7 +207,7 @@ def get_imitation_action(observation: Observation, game_state: Game, unit: Unit,
 
     # Worker Actions
     dest = game_state.occupied_xy_set
-    state = make_input(observation, unit.id)
+    state = make_input(observation, unit.id, game_state.parsed_updates)
 
     average_policy = np.zeros(6)
     ranked_policy = np.zeros(6)
@@ -1,5 +1,5 @@
-import heapq, time
-from collections import defaultdict, deque
+import array, time
+from collections import defaultdict
 from typing import DefaultDict, Dict, List, Tuple, Set
 from datetime import datetime
 import builtins as __builtin__
@@ -7,10 +7,17 @@ import builtins as __builtin__
 import numpy as np
 
 from .constants import Constants
-from .game_map import GameMap, RESOURCE_TYPES
-from .game_objects import Player, Unit, City
-from .game_position import Position
+from .game_map import ArrayGameMap, GameMap, RESOURCE_TYPES
+from .game_objects import Player, Unit, City, CityTile
+from .game_position import Position, use_position_table
 from .game_constants import GAME_CONSTANTS
+from .game_bitboard import Bitboard, BitboardGeometry
+from .game_distance import calculate_distance_fields, xy_sets_to_masks
+from .game_geometry import MapGeometry, get_map_geometry
+from .game_labels import ADJACENT_OFFSETS, TWO_STEPS_OFFSETS, ComponentLabels, any_at_offsets, get_iteration_rank
+from .game_paths import DirectionField, DistanceTable, LandmarkSearch, PathDistanceCache, get_edge_lengths
+from .game_stencil import DIAMOND_KERNEL, PLUS_KERNEL, StencilEngine
+from .game_updates import ParsedUpdates, parse_updates
 
 INPUT_CONSTANTS = Constants.INPUT_CONSTANTS
 
@@ -36,8 +43,73 @@ class Mission:
 
 
 class Missions(defaultdict):
+    """
+    the missions of the units, keyed by unit id
+    reverse indexes of the targets are updated when a mission is set or deleted, with [], add, del, pop or clear
+    the indexes by cluster and by unit position are for the clusters and the units given to bind
+    """
     def __init__(self):
-        self: DefaultDict[str, Mission] = defaultdict(Mission)
+        super().__init__()
+        self.units_of_target: DefaultDict[Tuple, Set[str]] = defaultdict(set)
+        self.units_of_build_target: DefaultDict[Tuple, Set[str]] = defaultdict(set)  # missions to build a citytile
+        self.nearby_units_of_target: DefaultDict[Tuple, Set[str]] = defaultdict(set)  # targets within five tiles of the unit
+        self.targeting_units_of_leader: DefaultDict[Tuple, Set[str]] = defaultdict(set)
+        self.resource_groups: 'DisjointSet' = None
+        self.units_by_id: Dict[str, Unit] = {}
+
+    def __setitem__(self, unit_id, mission: Mission):
+        if unit_id in self:
+            self._remove_from_indexes(unit_id, self[unit_id])
+        super().__setitem__(unit_id, mission)
+        self._add_to_indexes(unit_id, mission)
+
+    def __delitem__(self, unit_id):
+        self._remove_from_indexes(unit_id, self[unit_id])
+        super().__delitem__(unit_id)
+
+    def pop(self, unit_id, *default):
+        if unit_id in self:
+            self._remove_from_indexes(unit_id, self[unit_id])
+        return super().pop(unit_id, *default)
+
+    def clear(self):
+        super().clear()
+        for index in (self.units_of_target, self.units_of_build_target, self.nearby_units_of_target, self.targeting_units_of_leader):
+            index.clear()
+
+    def _add_to_indexes(self, unit_id, mission: Mission):
+        target = tuple(mission.target_position)
+        self.units_of_target[target].add(unit_id)
+        if mission.target_action and mission.target_action[:5] == "bcity":
+            self.units_of_build_target[target].add(unit_id)
+        if unit_id in self.units_by_id and self.units_by_id[unit_id].pos - mission.target_position <= 5:
+            self.nearby_units_of_target[target].add(unit_id)
+        if self.resource_groups is not None:
+            self.targeting_units_of_leader[self.resource_groups.find(target)].add(unit_id)
+
+    def _remove_from_indexes(self, unit_id, mission: Mission):
+        # the keys are removed with their last unit, so that the keys of an index are the targets with units
+        target = tuple(mission.target_position)
+        keys = [(self.units_of_target, target), (self.units_of_build_target, target), (self.nearby_units_of_target, target)]
+        if self.resource_groups is not None:
+            keys.append((self.targeting_units_of_leader, self.resource_groups.find(target)))
+        for index, key in keys:
+            if key in index:
+                index[key].discard(unit_id)
+                if not index[key]:
+                    del index[key]
+
+    def bind(self, resource_groups: 'DisjointSet', units_by_id: Dict[str, Unit]):
+        # the clusters and the units of the turn, the indexes that depend on them are rebuilt
+        self.resource_groups = resource_groups
+        self.units_by_id = units_by_id
+        self.nearby_units_of_target.clear()
+        self.targeting_units_of_leader.clear()
+        for unit_id, mission in self.items():
+            target = tuple(mission.target_position)
+            if unit_id in units_by_id and units_by_id[unit_id].pos - mission.target_position <= 5:
+                self.nearby_units_of_target[target].add(unit_id)
+            self.targeting_units_of_leader[resource_groups.find(target)].add(unit_id)
 
     def add(self, mission: Mission):
         self[mission.unit_id] = mission
@@ -49,7 +121,7 @@ class Missions(defaultdict):
         return [mission.target_position for unit_id, mission in self.items()]
 
     def get_target_of_unit(self, unit_id):
-        return {unit_id: mission.target_position for unit_id, mission in self.items()}[unit_id]
+        return self[unit_id].target_position
 
     def get_targets_and_actions(self):
         return [(mission.target_position, mission.target_action) for unit_id, mission in self.items()]
@@ -66,40 +138,98 @@ class Missions(defaultdict):
                     del self[unit_id]
                     continue
 
-class DisjointSet:
+class ChangeSet:
+    # what changed since the previous turn, for features that can be updated incrementally
     def __init__(self):
-        self.parent = {}
-        self.sizes = defaultdict(int)
-        self.points = defaultdict(int)  # 1 point for wood, 3 point for coal, 5 point for uranium
-        self.tiles = defaultdict(int)  # 1 point for all resource
-        self.citytiles = defaultdict(int)  # 1 point for citytile next to cluster
-        self.dist_from_player = defaultdict(int)  # closest distance from player
-        self.dist_from_opponent = defaultdict(int)  # closest distance from player
-        self.num_sets = 0
-
-    def find(self, a, point=0, tile=0, citytile=0):
-        assert type(a) == tuple
-        if a not in self.parent:
-            self.parent[a] = a
-            self.sizes[a] += 1
-            self.points[a] += point
-            self.tiles[a] += tile
-            self.citytiles[a] += citytile
-            self.num_sets += 1
-        acopy = a
-        while a != self.parent[a]:
-            a = self.parent[a]
-        while acopy != a:
-            self.parent[acopy], acopy = a, self.parent[acopy]
-        return a
+        self.full_rebuild: bool = False  # everything should be considered changed
+        self.resource_xy_set: Set = set()  # resource appeared, depleted or changed in amount
+        self.road_xy_set: Set = set()
+        self.citytile_added_xy_set: Set = set()
+        self.citytile_removed_xy_set: Set = set()
+        self.unit_xy_set: Set = set()  # cells that a unit has entered or left
+        self.units_added: Set[str] = set()
+        self.units_removed: Set[str] = set()
+        self.units_moved: Set[str] = set()
+
+    def __str__(self):
+        return " ".join(["{} {}".format(name, len(value)) for name, value in vars(self).items() if isinstance(value, set)])
+
+    def get_changed_xy_set(self) -> Set:
+        return self.resource_xy_set | self.road_xy_set | self.citytile_added_xy_set | \
+               self.citytile_removed_xy_set | self.unit_xy_set
+
+
+class DisjointSet:
+    """
+    union-find over the tiles of the map, stored by the flat index y*width+x
+    every tile starts as a set by itself, the methods take and return (x,y) tuples
+    the arrays are array.array, np.frombuffer gives a NumPy view without copying
+    """
+    aggregate_names = ("points", "tiles", "citytiles", "dist_from_player", "dist_from_opponent")
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        size = width * height
+        self.parent = array.array("q", range(size))
+        self.sizes = array.array("q", [1]) * size
+        self.points = array.array("q", [0]) * size  # 1 point for wood, 3 point for coal, 5 point for uranium
+        self.tiles = array.array("q", [0]) * size  # 1 point for all resource
+        self.citytiles = array.array("q", [0]) * size  # 1 point for citytile next to cluster
+        self.dist_from_player = array.array("q", [100]) * size  # closest distance from player
+        self.dist_from_opponent = array.array("q", [100]) * size  # closest distance from opponent
+        self.num_sets = size
+
+    @classmethod
+    def from_components(cls, components: ComponentLabels, **aggregates) -> 'DisjointSet':
+        # one set for each component, led by the first tile of the component
+        height, width = components.labels.shape
+        ds = cls(width, height)
+        ds.get_array("parent")[:] = components.tile_of_rank[components.labels.ravel()]
+        ds.set_by_label(components, sizes=components.sizes, **aggregates)
+        ds.num_sets = int(np.count_nonzero(components.sizes))
+        return ds
+
+    def get_array(self, name) -> np.ndarray:
+        # NumPy view of one of the arrays, indexed by flat index
+        return np.frombuffer(getattr(self, name), dtype=np.int64)
+
+    def set_by_label(self, components: ComponentLabels, **aggregates):
+        # aggregates given as arrays indexed by label, stored at the leader of each label
+        # the sets have to be the components, as after from_components
+        for name, values in aggregates.items():
+            self.get_array(name)[components.tile_of_rank] = values
+
+    def _find(self, i) -> int:
+        parent = self.parent
+        root = i
+        while root != parent[root]:
+            root = parent[root]
+        while i != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def find(self, a) -> Tuple[int,int]:
+        x, y = a
+        y, x = divmod(self._find(y * self.width + x), self.width)
+        return x, y
+
+    def find_all(self, indices: np.ndarray) -> np.ndarray:
+        # roots of an array of flat indices
+        parent = self.get_array("parent")
+        roots = parent[indices]
+        while True:
+            grandparents = parent[roots]
+            if np.array_equal(grandparents, roots):
+                return roots
+            roots = grandparents
 
     def union(self, a, b):
-        assert type(a) == tuple
-        assert type(b) == tuple
-        a, b = self.find(a), self.find(b)
+        a, b = self._find(a[1] * self.width + a[0]), self._find(b[1] * self.width + b[0])
         if a != b:
-            # if self.sizes[a] < self.sizes[b]:
-            #     a, b = b, a
+            # the larger set leads
+            if self.sizes[a] < self.sizes[b]:
+                a, b = b, a
 
             self.num_sets -= 1
             self.parent[b] = a
@@ -107,55 +237,37 @@ class DisjointSet:
             self.points[a] += self.points[b]
             self.tiles[a] += self.tiles[b]
             self.citytiles[a] += self.citytiles[b]
+            self.dist_from_player[a] = min(self.dist_from_player[a], self.dist_from_player[b])
+            self.dist_from_opponent[a] = min(self.dist_from_opponent[a], self.dist_from_opponent[b])
 
     def get_size(self, a):
-        assert type(a) == tuple
-        return self.sizes[self.find(a)]
+        return self.sizes[self._find(a[1] * self.width + a[0])]
 
     def get_point(self, a):
-        assert type(a) == tuple
-        return self.points[self.find(a)]
+        return self.points[self._find(a[1] * self.width + a[0])]
 
     def get_tiles(self, a):
-        assert type(a) == tuple
-        return self.tiles[self.find(a)]
+        return self.tiles[self._find(a[1] * self.width + a[0])]
 
     def get_citytiles(self, a):
-        assert type(a) == tuple
-        return self.citytiles[self.find(a)]
+        return self.citytiles[self._find(a[1] * self.width + a[0])]
 
     def get_dist_from_player(self, a):
-        assert type(a) == tuple
-        if self.find(a) not in self.dist_from_player:
-            return 100
-        return self.dist_from_player[self.find(a)]
+        return self.dist_from_player[self._find(a[1] * self.width + a[0])]
 
     def get_dist_from_opponent(self, a):
-        assert type(a) == tuple
-        if self.find(a) not in self.dist_from_opponent:
-            return 100
-        return self.dist_from_opponent[self.find(a)]
+        return self.dist_from_opponent[self._find(a[1] * self.width + a[0])]
 
-    def get_groups(self):
+    def get_groups(self) -> Dict[Tuple, List[Tuple]]:
         groups = defaultdict(list)
-        for element in self.parent:
-            leader = self.find(element)
-            if leader:
-                groups[leader].append(element)
+        roots = self.find_all(np.arange(self.width * self.height))
+        for i, root in enumerate(roots.tolist()):
+            groups[root % self.width, root // self.width].append((i % self.width, i // self.width))
         return groups
 
-    def get_groups_sorted_by_citytile_size(self):
-        groups = defaultdict(list)
-        for element in self.parent:
-            leader = self.find(element)
-            if leader:
-                groups[leader].append(element)
-        leaders = list(groups.keys())
-        leaders.sort(key=lambda leader: (self.get_citytiles(leader), self.get_tiles(leader)), reverse=True)
-        return [groups[leader] for leader in leaders if self.get_point(leader) > 0]
-
     def get_group_count(self):
-        return sum(self.points[leader] > 1 for leader in self.get_groups().keys())
+        roots = np.nonzero(self.get_array("parent") == np.arange(self.width * self.height))[0]
+        return int(np.count_nonzero(self.get_array("points")[roots] > 1))
 
 
 class Game:
@@ -163,6 +275,60 @@ class Game:
     # counted from the time after the objects are saved to disk
     compute_start_time = -1
 
+    # GameMap keeps one Cell object per tile, ArrayGameMap keeps flat arrays
+    map_class = ArrayGameMap
+
+    # exact distances are looked up in a DistanceTable instead of the path search of each target
+    # the table computes the player citytiles together when the first exact distance is asked after calculate_features
+    use_distance_table = False
+
+    # shortest path kernel of the exact distances, one of PATH_SEARCH_KERNELS
+    # it can be changed during the game with path_distance_cache.set_kernel
+    path_search_kernel = "bucket"
+
+    # how make_unit_missions assigns the cluster targets of the units
+    # "greedy" plans one unit after the other with find_best_cluster, later units see the targets of earlier units
+    # "matching" plans the units together with a minimum cost assignment, see heuristics.assign_cluster_targets
+    mission_assignment = "greedy"
+
+    # features that are only computed when they are first read
+    # method: (features set by the method, state the features are computed from)
+    # the features are computed again if that state has changed when calculate_features is called
+    lazy_features: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+        "calculate_side_matrices": (
+            ("wood_side_matrix", "coal_side_matrix", "uranium_side_matrix"), ("turn", "units")),
+        "calculate_convolved_two_opponent_assets": (
+            ("convolved_two_opponent_assets_matrix",), ("turn", "units")),
+        "calculate_floodfill_by_player_city": (
+            ("floodfill_by_player_city_set", "distance_from_floodfill_by_player_city"), ("turn", "units")),
+        "calculate_floodfill_by_opponent_city": (
+            ("floodfill_by_opponent_city_set", "distance_from_floodfill_by_opponent_city"), ("turn", "units")),
+        "calculate_floodfill_by_either_city": (
+            ("floodfill_by_either_city_set", "distance_from_floodfill_by_either_city"), ("turn", "units")),
+        "calculate_floodfill_by_empty_tile": (
+            ("floodfill_by_empty_tile_set", "distance_from_floodfill_by_empty_tile"), ("turn", "units")),
+        "calculate_resource_centres": (
+            ("distance_from_resource_mean", "resource_mean", "distance_from_resource_median", "resource_median"), ("turn", "research")),
+        "calculate_player_unit_median": (
+            ("distance_from_player_unit_median", "player_unit_median"), ("turn", "units")),
+        "calculate_player_city_median": (
+            ("distance_from_player_city_median", "player_city_median"), ("turn",)),
+        "calculate_preferred_median": (
+            ("distance_from_preferred_median", "player_preferred_median"), ("turn",)),
+    }
+    lazy_feature_methods: Dict[str, str] = {
+        feature: method_name for method_name, (features, _) in lazy_features.items() for feature in features}
+
+    def __getattr__(self, name):
+        # only called when the attribute is not set
+        if name not in Game.lazy_feature_methods or "feature_sources" not in self.__dict__:
+            raise AttributeError(name)
+        method_name = Game.lazy_feature_methods[name]
+        getattr(self, method_name)()
+        _, sources = Game.lazy_features[method_name]
+        self.lazy_feature_sources[method_name] = {source: self.feature_sources[source] for source in sources}
+        return self.__dict__[name]
+
     def _initialize(self, messages):
         """
         initialize state
@@ -173,9 +339,14 @@ class Game:
         mapInfo = messages[1].split(" ")
         self.map_width: int = int(mapInfo[0])
         self.map_height: int = int(mapInfo[1])
-        self.map: GameMap = GameMap(self.map_width, self.map_height)
+        use_position_table(self.map_width, self.map_height)
+        self.map: GameMap = self.map_class(self.map_width, self.map_height)
         self.players: List[Player] = [Player(0), Player(1)]
 
+        self.map_geometry: MapGeometry = get_map_geometry(self.map_width, self.map_height)
+        self.path_distance_cache: PathDistanceCache = PathDistanceCache(self.map_geometry, kernel=self.path_search_kernel)
+        self.stencil: StencilEngine = StencilEngine()
+
         self.y_order_coefficient = 1
         self.x_order_coefficient = 1
         self.x_iteration_order = list(range(self.map_width))
@@ -242,9 +413,28 @@ class Game:
 
     def _update(self, messages):
         """
-        update state
+        update state, rebuilding the map and all entities
+        """
+        self.map: GameMap = self.map_class(self.map_width, self.map_height)
+        self.resource_amount_turn: int = None  # turn of the map the resource amount matrices were read from
+        self.parsed_updates: ParsedUpdates = None
+        self.tracked_units: Dict[str, Unit] = {}
+        self.tracked_citytiles: Dict[Tuple, CityTile] = {}
+        self._apply_updates(messages)
+        self.changes.full_rebuild = True
+
+
+    def _update_incremental(self, messages):
         """
-        self.map = GameMap(self.map_width, self.map_height)
+        update state, keeping the map and entities of the previous turn and applying only what changed
+        """
+        if not hasattr(self, "parsed_updates"):
+            # state from an older snapshot
+            return self._update(messages)
+        self._apply_updates(messages)
+
+
+    def _apply_updates(self, messages):
         self.turn += 1
         self._reset_player_states()
 
@@ -259,60 +449,88 @@ class Game:
 
         self.is_day_time = self.turns_to_dawn == 0
 
-        for update in messages:
-            if update == "D_DONE":
-                break
-            strs = update.split(" ")
-            input_identifier = strs[0]
-
-            if input_identifier == INPUT_CONSTANTS.RESEARCH_POINTS:
-                team = int(strs[1])   # probably player_id
-                self.players[team].research_points = int(strs[2])
-
-            elif input_identifier == INPUT_CONSTANTS.RESOURCES:
-                r_type = strs[1]
-                x = int(strs[2])
-                y = int(strs[3])
-                amt = int(float(strs[4]))
-                self.map._setResource(r_type, x, y, amt)
+        self.changes: ChangeSet = ChangeSet()
 
-            elif input_identifier == INPUT_CONSTANTS.UNITS:
-                unittype = int(strs[1])
-                team = int(strs[2])
-                unitid = strs[3]
-                x = int(strs[4])
-                y = int(strs[5])
-                cooldown = float(strs[6])
-                wood = int(strs[7])
-                coal = int(strs[8])
-                uranium = int(strs[9])
+        # parsed once per turn, also used by the imitation agent
+        previous_updates: ParsedUpdates = self.parsed_updates
+        self.parsed_updates: ParsedUpdates = parse_updates(messages, previous_updates)
+        updates = self.parsed_updates
+
+        for team, research_points in updates.research.tolist():
+            self.players[team].research_points = research_points
+
+        previous_resources = {}
+        if previous_updates is not None:
+            previous_resources = {(x,y): (r_type, amt) for r_type, x, y, amt in previous_updates.resources.tolist()}
+        current_resource_xy_set = set()
+        for r_type, x, y, amt in updates.resources.tolist():
+            current_resource_xy_set.add((x,y))
+            if previous_resources.get((x,y)) != (r_type, amt):
+                self.map._setResource(r_type, x, y, amt)
+                self.changes.resource_xy_set.add((x,y))
+        for x,y in previous_resources.keys() - current_resource_xy_set:
+            self.map._removeResource(x, y)
+            self.changes.resource_xy_set.add((x,y))
+
+        # cell.unit refers to the last unit reported on the cell
+        for unit in self.tracked_units.values():
+            self.map._removeUnits(unit.pos.x, unit.pos.y)
+
+        current_unit_ids = set()
+        for unittype, team, unitid, x, y, cooldown, wood, coal, uranium in updates.units.tolist():
+            current_unit_ids.add(unitid)
+            unit = self.tracked_units.get(unitid)
+            if unit is None:
                 unit = Unit(team, unittype, unitid, x, y, cooldown, wood, coal, uranium)
-                self.players[team].units.append(unit)
-                self.map.get_cell(x, y).unit = unit
-
-            elif input_identifier == INPUT_CONSTANTS.CITY:
-                team = int(strs[1])
-                cityid = strs[2]
-                fuel = float(strs[3])
-                lightupkeep = float(strs[4])
-                self.players[team].cities[cityid] = City(team, cityid, fuel, lightupkeep, self.night_turns_left)
-
-            elif input_identifier == INPUT_CONSTANTS.CITY_TILES:
-                team = int(strs[1])
-                cityid = strs[2]
-                x = int(strs[3])
-                y = int(strs[4])
-                cooldown = float(strs[5])
-                city = self.players[team].cities[cityid]
+                self.tracked_units[unitid] = unit
+                self.changes.units_added.add(unitid)
+                self.changes.unit_xy_set.add((x,y))
+            else:
+                if unit.pos.x != x or unit.pos.y != y:
+                    self.changes.units_moved.add(unitid)
+                    self.changes.unit_xy_set.add(tuple(unit.pos))
+                    self.changes.unit_xy_set.add((x,y))
+                unit._update(x, y, cooldown, wood, coal, uranium)
+            self.players[team].units.append(unit)
+            self.map._setUnit(x, y, unit)
+        for unitid in self.tracked_units.keys() - current_unit_ids:
+            unit = self.tracked_units.pop(unitid)
+            self.changes.units_removed.add(unitid)
+            self.changes.unit_xy_set.add(tuple(unit.pos))
+
+        for team, cityid, fuel, lightupkeep in updates.cities.tolist():
+            self.players[team].cities[cityid] = City(team, cityid, fuel, lightupkeep, self.night_turns_left)
+
+        citytile_records = updates.citytiles.tolist()
+        current_citytile_keys = set(record[:4] for record in citytile_records)
+        for key in self.tracked_citytiles.keys() - current_citytile_keys:
+            citytile = self.tracked_citytiles.pop(key)
+            self.map._removeCityTile(citytile.pos.x, citytile.pos.y)
+            self.changes.citytile_removed_xy_set.add(tuple(citytile.pos))
+        for team, cityid, x, y, cooldown in citytile_records:
+            city = self.players[team].cities[cityid]
+            citytile = self.tracked_citytiles.get((team, cityid, x, y))
+            if citytile is None:
                 citytile = city._add_city_tile(x, y, cooldown)
-                self.map.get_cell(x, y).citytile = citytile
-                self.players[team].city_tile_count += 1
-
-            elif input_identifier == INPUT_CONSTANTS.ROADS:
-                x = int(strs[1])
-                y = int(strs[2])
-                road = float(strs[3])
-                self.map.get_cell(x, y).road = road
+                self.tracked_citytiles[team, cityid, x, y] = citytile
+                self.map._setCityTile(x, y, citytile)
+                self.changes.citytile_added_xy_set.add((x,y))
+            else:
+                city._reuse_city_tile(citytile, cooldown)
+            self.players[team].city_tile_count += 1
+
+        previous_roads = {}
+        if previous_updates is not None:
+            previous_roads = {(x,y): road for x, y, road in previous_updates.roads.tolist()}
+        current_road_xy_set = set()
+        for x, y, road in updates.roads.tolist():
+            current_road_xy_set.add((x,y))
+            if previous_roads.get((x,y)) != road:
+                self.map._setRoad(x, y, road)
+                self.changes.road_xy_set.add((x,y))
+        for x,y in previous_roads.keys() - current_road_xy_set:
+            self.map._setRoad(x, y, 0)
+            self.changes.road_xy_set.add((x,y))
 
         # create indexes to refer to unit by id
         self.player.make_index_units_by_id()
@@ -352,6 +570,9 @@ class Game:
         self.uranium_fuel_rate = GAME_CONSTANTS["PARAMETERS"]["RESOURCE_TO_FUEL_RATE"][RESOURCE_TYPES.URANIUM.upper()]
         self.uranium_collection_rate = GAME_CONSTANTS["PARAMETERS"]["WORKER_COLLECTION_RATE"][RESOURCE_TYPES.URANIUM.upper()]
 
+        self.invalidate_lazy_features()
+        self.stencil.reset()
+
         # update matrices
         self.calculate_matrix()
         self.calculate_resource_matrix()
@@ -493,79 +714,97 @@ class Game:
         update_mission_delay(self, missions)
 
 
+    def get_feature_sources(self):
+        # what the lazy features are computed from, compared between calls of calculate_features
+        return {
+            "turn": self.turn,
+            "research": (self.player.research_points, self.opponent.research_points),
+            "units": tuple((unit.id, unit.pos.x, unit.pos.y) for player in self.players for unit in player.units),
+        }
+
+
+    def invalidate_lazy_features(self):
+        feature_sources = self.get_feature_sources()
+        if "lazy_feature_sources" not in self.__dict__:
+            self.lazy_feature_sources: Dict[str, Dict] = {}
+        for method_name, sources in list(self.lazy_feature_sources.items()):
+            if all(feature_sources[source] == value for source, value in sources.items()):
+                continue
+            del self.lazy_feature_sources[method_name]
+            features, _ = Game.lazy_features[method_name]
+            for feature in features:
+                self.__dict__.pop(feature, None)
+        for method_name, (features, _) in Game.lazy_features.items():
+            if method_name not in self.lazy_feature_sources:
+                for feature in features:
+                    self.__dict__.pop(feature, None)
+        self.feature_sources = feature_sources
+
+
     def init_matrix(self, default_value=0):
         # [TODO] check if order of map_height and map_width is correct
         return np.full((self.map_height,self.map_width), default_value)
 
 
+    def calculate_resource_amount_matrix(self):
+        # amount of resources left on the tile
+        # after the previous turn only the tiles in the resource changes are read again, and the second pass of a turn reads nothing
+        if self.resource_amount_turn == self.turn:
+            return
+        if self.changes.full_rebuild or self.resource_amount_turn != self.turn - 1:
+            self.wood_amount_matrix = self.map.get_resource_amount_matrix(RESOURCE_TYPES.WOOD)
+            self.coal_amount_matrix = self.map.get_resource_amount_matrix(RESOURCE_TYPES.COAL)
+            self.uranium_amount_matrix = self.map.get_resource_amount_matrix(RESOURCE_TYPES.URANIUM)
+            self.all_resource_amount_matrix = self.map.get_resource_amount_matrix()
+        elif self.changes.resource_xy_set:
+            # copied, the matrices of the previous turn may still be referenced
+            amount_matrices = {
+                RESOURCE_TYPES.WOOD: self.wood_amount_matrix.copy(),
+                RESOURCE_TYPES.COAL: self.coal_amount_matrix.copy(),
+                RESOURCE_TYPES.URANIUM: self.uranium_amount_matrix.copy(),
+            }
+            self.all_resource_amount_matrix = self.all_resource_amount_matrix.copy()
+            for x,y in self.changes.resource_xy_set:
+                cell = self.map.get_cell(x,y)
+                for r_type, matrix in amount_matrices.items():
+                    matrix[y,x] = cell.resource.amount if cell.has_resource() and cell.resource.type == r_type else 0
+                self.all_resource_amount_matrix[y,x] = cell.resource.amount if cell.has_resource() else 0
+            self.wood_amount_matrix = amount_matrices[RESOURCE_TYPES.WOOD]
+            self.coal_amount_matrix = amount_matrices[RESOURCE_TYPES.COAL]
+            self.uranium_amount_matrix = amount_matrices[RESOURCE_TYPES.URANIUM]
+        self.resource_amount_turn = self.turn
+
+
     def calculate_matrix(self):
 
-        # amount of resources left on the tile
-        self.wood_amount_matrix = self.init_matrix()
-        self.coal_amount_matrix = self.init_matrix()
-        self.uranium_amount_matrix = self.init_matrix()
-        self.all_resource_amount_matrix = self.init_matrix()
+        self.calculate_resource_amount_matrix()
 
-        self.player_city_tile_matrix = self.init_matrix()
-        self.opponent_city_tile_matrix = self.init_matrix()
+        # a citytile is not counted if the tile also has resources
+        has_resource = self.all_resource_amount_matrix > 0
+        citytile_team_matrix = np.where(has_resource, -1, self.map.get_citytile_team_matrix())
+        has_citytile = citytile_team_matrix >= 0
+        self.player_city_tile_matrix = (citytile_team_matrix == self.player_id).astype(int)
+        self.opponent_city_tile_matrix = (has_citytile & (citytile_team_matrix != self.player_id)).astype(int)
 
         self.player_units_matrix = self.init_matrix()
         self.opponent_units_matrix = self.init_matrix()
 
         # if there is nothing on tile
-        self.empty_tile_matrix = self.init_matrix()
+        # cell.unit only contain one unit even though multiple units can stay in citytile
+        self.empty_tile_matrix = (~has_resource & ~has_citytile & ~self.map.get_unit_exist_matrix()).astype(int)
 
         # if you can build on tile (a unit may be on the tile)
-        self.buildable_tile_matrix = self.init_matrix()
-        self.probably_buildable_tile_matrix = self.init_matrix()
-        self.preferred_buildable_tile_matrix = self.init_matrix()
-
-        self.road_level_matrix = self.init_matrix()
-
-        for y in self.y_iteration_order:
-            for x in self.x_iteration_order:
-                cell = self.map.get_cell(x, y)
-
-                self.road_level_matrix[y,x] = cell.road
-
-                is_empty = True
-                is_buildable = True
-
-                if cell.unit:
-                    is_empty = False
-                    # unit counting method implemented later
-                    # cell.unit only contain one unit even though multiple units can stay in citytile
-
-                if cell.has_resource():
-                    is_empty = False
-                    is_buildable = False
-                    if cell.resource.type == RESOURCE_TYPES.WOOD:
-                        self.wood_amount_matrix[y,x] += cell.resource.amount
-                    if cell.resource.type == RESOURCE_TYPES.COAL:
-                        self.coal_amount_matrix[y,x] += cell.resource.amount
-                    if cell.resource.type == RESOURCE_TYPES.URANIUM:
-                        self.uranium_amount_matrix[y,x] += cell.resource.amount
-                    self.all_resource_amount_matrix[y,x] += cell.resource.amount
-
-                elif cell.citytile:
-                    is_empty = False
-                    is_buildable = False
-                    if cell.citytile.team == self.player_id:
-                        self.player_city_tile_matrix[y,x] += 1
-                    else:   # city tile belongs to opponent
-                        self.opponent_city_tile_matrix[y,x] += 1
-
-                if is_empty:
-                    self.empty_tile_matrix[y,x] += 1
-
-                if is_buildable:
-                    self.buildable_tile_matrix[y,x] += 1
+        self.buildable_tile_matrix = (~has_resource & ~has_citytile).astype(int)
 
-        for unit in self.player.units:
-            self.player_units_matrix[unit.pos.y,unit.pos.x] += 1
+        # road levels are truncated to integers
+        self.road_level_matrix = self.map.get_road_matrix().astype(int)
 
-        for unit in self.opponent.units:
-            self.opponent_units_matrix[unit.pos.y,unit.pos.x] += 1
+        # not taken from the parsed updates, make_city_actions adds placeholder units for the workers it builds
+        for units_matrix, units in [
+            [self.player_units_matrix,      self.player.units],
+            [self.opponent_units_matrix,    self.opponent.units]]:
+            if units:
+                np.add.at(units_matrix, ([unit.pos.y for unit in units], [unit.pos.x for unit in units]), 1)
 
         # binary matrices
         self.wood_exist_matrix = (self.wood_amount_matrix > 0).astype(int)
@@ -573,20 +812,13 @@ class Game:
         self.uranium_exist_matrix = (self.uranium_amount_matrix > 0).astype(int)
         self.all_resource_exist_matrix = (self.all_resource_amount_matrix > 0).astype(int)
 
-        self.convolved_wood_exist_matrix = self.convolve(self.wood_exist_matrix)
-        self.convolved_coal_exist_matrix = self.convolve(self.coal_exist_matrix)
-        self.convolved_uranium_exist_matrix = self.convolve(self.uranium_exist_matrix)
+        self.convolved_wood_exist_matrix, self.convolved_coal_exist_matrix, self.convolved_uranium_exist_matrix = \
+            self.stencil.convolve_batch("resource_exist", [self.wood_exist_matrix, self.coal_exist_matrix, self.uranium_exist_matrix])
 
         self.resource_collection_rate = self.convolved_wood_exist_matrix * 20 + self.convolved_coal_exist_matrix * 5 + self.convolved_uranium_exist_matrix * 2
         self.fuel_collection_rate = self.convolved_wood_exist_matrix * 20 + self.convolved_coal_exist_matrix * 5 * 5 + self.convolved_uranium_exist_matrix * 2 * 20
 
-        # positive if on empty cell and beside the resource
-        self.wood_side_matrix = self.convolve(self.wood_exist_matrix) * self.empty_tile_matrix
-        self.coal_side_matrix = self.convolve(self.coal_exist_matrix) * self.empty_tile_matrix
-        self.uranium_side_matrix = self.convolve(self.uranium_exist_matrix) * self.empty_tile_matrix
-
         self.convolved_opponent_assets_matrix = self.convolve(self.opponent_units_matrix + self.opponent_city_tile_matrix)
-        self.convolved_two_opponent_assets_matrix = self.convolve_two(self.opponent_units_matrix + self.opponent_city_tile_matrix)
 
         self.convert_into_sets()
 
@@ -596,86 +828,63 @@ class Game:
 
     def get_floodfill(self, set_object):
         # return the largest connected graph ignoring blockers
-        ds = DisjointSet()
-        for y in self.y_iteration_order:
-            for x in self.x_iteration_order:
-                if (x,y) in set_object:
-                    continue
-                for dy,dx in self.dirs_dxdy[:-1]:
-                    xx, yy = x+dx, y+dy
-                    if (xx,yy) in self.xy_out_of_map:
-                        continue
-                    if (xx,yy) in set_object:
-                        continue
-                    ds.union((x,y), (xx,yy))
+        unblocked = ~xy_sets_to_masks([set_object], self.map_width, self.map_height)[0]
+        components = ComponentLabels(self.iteration_rank, [(dy, dx, unblocked, unblocked) for dy,dx in ADJACENT_OFFSETS])
 
-        floodfills = sorted(ds.get_groups().values(), key=len, reverse=True)
+        # tiles that are not connected to any other tile are not part of a floodfill
+        # larger floodfills first, then by the first tile in the iteration order
+        labels = np.nonzero(components.sizes > 1)[0]
+        labels = labels[np.argsort(-components.sizes[labels], kind="stable")]
 
         # for smaller maps, resources may divide the map into two
-        all_floodfill = set()
-        for floodfill in floodfills:
-            all_floodfill.update(floodfill)
-            if len(all_floodfill) > self.map_width * self.map_height * 0.7 - len(self.occupied_xy_set):
-                return all_floodfill
-        return all_floodfill
+        cumulative_sizes = np.cumsum(components.sizes[labels])
+        exceeded = np.nonzero(cumulative_sizes > self.map_width * self.map_height * 0.7 - self.occupied_xy_count)[0]
+        if len(exceeded):
+            labels = labels[:exceeded[0]+1]
+        return Bitboard.from_matrix(self.bitboard_geometry, components.get_mask_of_labels(labels))
 
 
     def populate_set(self, matrix, set_object):
         # modifies the set_object in place and add nonzero items in the matrix
-        for y in self.y_iteration_order:
-            for x in self.x_iteration_order:
-                if matrix[y,x] > 0:
-                    set_object.add((x,y))
+        # items are added in the iteration order, y in the outer loop
+        x_order, y_order = np.array(self.x_iteration_order), np.array(self.y_iteration_order)
+        ys, xs = np.nonzero(matrix[np.ix_(y_order, x_order)] > 0)
+        set_object.update(zip(x_order[xs].tolist(), y_order[ys].tolist()))
 
 
     def convert_into_sets(self):
-        self.wood_exist_xy_set = set()
-        self.coal_exist_xy_set = set()
-        self.uranium_exist_xy_set = set()
-        self.player_city_tile_xy_set = set()
-        self.opponent_city_tile_xy_set = set()
-        self.player_units_xy_set = set()
-        self.opponent_units_xy_set = set()
-        self.empty_tile_xy_set = set()
-        self.buildable_tile_xy_set = set()
-        self.probably_buildable_tile_xy_set = set()
-        self.preferred_buildable_tile_xy_set = set()
-
-        for set_object, matrix in [
-            [self.wood_exist_xy_set,            self.wood_exist_matrix],
-            [self.coal_exist_xy_set,            self.coal_exist_matrix],
-            [self.uranium_exist_xy_set,         self.uranium_exist_matrix],
-            [self.player_city_tile_xy_set,      self.player_city_tile_matrix],
-            [self.opponent_city_tile_xy_set,    self.opponent_city_tile_matrix],
-            [self.player_units_xy_set,          self.player_units_matrix],
-            [self.opponent_units_xy_set,        self.opponent_units_matrix],
-            [self.empty_tile_xy_set,            self.empty_tile_matrix],
-            [self.buildable_tile_xy_set,        self.buildable_tile_matrix]]:
-
-            self.populate_set(matrix, set_object)
-
-        self.xy_out_of_map: Set = set()
-        for y in [-1, self.map_height]:
-            for x in range(self.map_width):
-                self.xy_out_of_map.add((x,y))
-        for y in range(self.map_height):
-            for x in [-1, self.map_width]:
-                self.xy_out_of_map.add((x,y))
-
+        self.bitboard_geometry = BitboardGeometry(self.map_width, self.map_height, self.x_iteration_order, self.y_iteration_order)
+        self.iteration_rank = get_iteration_rank(self.map_width, self.map_height, self.x_iteration_order, self.y_iteration_order)
+        geometry = self.bitboard_geometry
+
+        self.wood_exist_xy_set = Bitboard.from_matrix(geometry, self.wood_exist_matrix)
+        self.coal_exist_xy_set = Bitboard.from_matrix(geometry, self.coal_exist_matrix)
+        self.uranium_exist_xy_set = Bitboard.from_matrix(geometry, self.uranium_exist_matrix)
+        self.player_city_tile_xy_set = Bitboard.from_matrix(geometry, self.player_city_tile_matrix)
+        self.opponent_city_tile_xy_set = Bitboard.from_matrix(geometry, self.opponent_city_tile_matrix)
+        self.player_units_xy_set = Bitboard.from_matrix(geometry, self.player_units_matrix)
+        self.opponent_units_xy_set = Bitboard.from_matrix(geometry, self.opponent_units_matrix)
+        self.empty_tile_xy_set = Bitboard.from_matrix(geometry, self.empty_tile_matrix)
+        self.buildable_tile_xy_set = Bitboard.from_matrix(geometry, self.buildable_tile_matrix)
+
+        self.xy_out_of_map = Bitboard(geometry, self.map_geometry.out_of_map_mask)
+
+        # buildable tiles beside a player citytile, preferred if the city has fuel to spare for the night
+        surplus_city_tile_matrix = self.init_matrix()
         for x,y in self.player_city_tile_xy_set:
-            city = self.player.cities[self.map.get_cell(x,y).citytile.cityid]
-            for dx, dy in self.dirs_dxdy[:-1]:
-                xx,yy = x+dx,y+dy
-                if 0 <= xx < self.map_width and 0 <= yy < self.map_height:
-                    if self.buildable_tile_matrix[yy,xx]:
-                        self.probably_buildable_tile_matrix[yy,xx] = 1
-                        if city.fuel_needed_for_night <= -18:
-                            self.preferred_buildable_tile_matrix[yy,xx] = 1
-
-        self.populate_set(self.probably_buildable_tile_matrix, self.probably_buildable_tile_xy_set)
-        self.populate_set(self.preferred_buildable_tile_matrix, self.preferred_buildable_tile_xy_set)
-
-        self.opponent_units_moveable_xy_set: Set = set()
+            city = self.player.cities[self.map.get_cityid_of_cell(x,y)]
+            if city.fuel_needed_for_night <= -18:
+                surplus_city_tile_matrix[y,x] = 1
+        buildable_tile_matrix = self.buildable_tile_matrix > 0
+        convolved_player_city_tile_matrix, convolved_surplus_city_tile_matrix = \
+            self.stencil.convolve_batch("player_city_tile", [self.player_city_tile_matrix, surplus_city_tile_matrix])
+        self.probably_buildable_tile_matrix = (buildable_tile_matrix & (convolved_player_city_tile_matrix > 0)).astype(int)
+        self.preferred_buildable_tile_matrix = (buildable_tile_matrix & (convolved_surplus_city_tile_matrix > 0)).astype(int)
+
+        self.probably_buildable_tile_xy_set = Bitboard.from_matrix(geometry, self.probably_buildable_tile_matrix)
+        self.preferred_buildable_tile_xy_set = Bitboard.from_matrix(geometry, self.preferred_buildable_tile_matrix)
+
+        self.opponent_units_moveable_xy_set = Bitboard(geometry)
         for unit in self.opponent.units:
             can_build = tuple(unit.pos) in self.buildable_tile_xy_set and unit.get_cargo_space_used() == 100
             if unit.can_act() and not can_build:
@@ -690,217 +899,233 @@ class Game:
                                 self.opponent_city_tile_xy_set | self.xy_out_of_map) \
                                 - self.player_city_tile_xy_set - self.opponent_units_moveable_xy_set
 
-        self.floodfill_by_player_city_set = self.get_floodfill(self.player_city_tile_xy_set)
-        self.floodfill_by_opponent_city_set = self.get_floodfill(self.opponent_city_tile_xy_set)
-        self.floodfill_by_either_city_set = self.get_floodfill(self.player_city_tile_xy_set | self.opponent_city_tile_xy_set)
-
-        self.floodfill_by_empty_tile_set = self.get_floodfill(
-            self.player_city_tile_xy_set | self.opponent_city_tile_xy_set | self.wood_exist_xy_set | self.coal_exist_xy_set | self.uranium_exist_xy_set)
+        # occupied_xy_set is modified while making actions, the floodfills are computed with the count before that
+        self.occupied_xy_count: int = len(self.occupied_xy_set)
 
         self.ejected_units_set: Set = set()
 
     def calculate_distance_matrix(self, blockade_multiplier_value=100):
-        self.distance_from_edge = self.init_matrix(self.map_height + self.map_width)
-        for y in range(self.map_height):
-            y_distance_from_edge = min(y, self.map_height-y-1)
-            for x in range(self.map_width):
-                x_distance_from_edge = min(x, self.map_height-x-1)
-                self.distance_from_edge[y,x] = y_distance_from_edge + x_distance_from_edge
-
-        def calculate_distance_from_set(relevant_set):
-            visited = set()
-            matrix = self.init_matrix(default_value=99)
-            for y in self.y_iteration_order:
-                for x in self.x_iteration_order:
-                    if (x,y) in relevant_set:
-                        visited.add((x,y))
-                        matrix[y,x] = 0
-
-            queue = deque(list(visited))
-            while queue:
-                x,y = queue.popleft()
-                for dx,dy in self.dirs_dxdy[:-1]:
-                    xx, yy = x+dx, y+dy
-                    if (xx,yy) in visited:
-                        continue
-                    if 0 <= xx < self.map_width and 0 <= yy < self.map_height:
-                        matrix[yy,xx] = matrix[y,x] + 1
-                        queue.append((xx,yy))
-                        visited.add((xx,yy))
-            return matrix
+        self.distance_from_edge = self.map_geometry.distance_from_edge
+
+        # unweighted distances from each set of tiles, all computed in one pass
+        (
+            # calculate distance from resource (with projected research requirements)
+            self.distance_from_collectable_resource,
+            self.distance_from_collectable_resource_projected,
+
+            # calculate distance from citytiles or units
+            self.distance_from_player_assets,
+            self.distance_from_opponent_assets,
+            self.distance_from_player_units,
+            self.distance_from_opponent_units,
+            self.distance_from_player_citytiles,
+            self.distance_from_opponent_citytiles,
+
+            self.distance_from_buildable_tile,
+            self.distance_from_empty_tile,
+            self.distance_from_wood_tile,
+
+            self.distance_from_preferred_buildable,
+            self.distance_from_probably_buildable,
+        ) = calculate_distance_fields(xy_sets_to_masks([
+            self.collectable_tiles_xy_set,
+            self.collectable_tiles_projected_xy_set,
+
+            self.player_units_xy_set | self.player_city_tile_xy_set,
+            self.opponent_units_xy_set | self.opponent_city_tile_xy_set,
+            self.player_units_xy_set,
+            self.opponent_units_xy_set,
+            self.player_city_tile_xy_set,
+            self.opponent_city_tile_xy_set,
+
+            self.buildable_tile_xy_set,
+            self.empty_tile_xy_set,
+            self.wood_exist_xy_set,
+
+            self.preferred_buildable_tile_xy_set,
+            self.probably_buildable_tile_xy_set,
+        ], self.map_width, self.map_height))
 
+        # some features for blocking logic
+        self.opponent_unit_adjacent_xy_set = Bitboard.from_matrix(self.bitboard_geometry, self.distance_from_opponent_units == 1)
+        self.opponent_unit_adjacent_and_buildable_xy_set = self.opponent_unit_adjacent_xy_set & self.buildable_tile_xy_set
+        self.opponent_unit_adjacent_and_player_city_xy_set = self.opponent_unit_adjacent_xy_set & self.player_city_tile_xy_set
+
+        # standardised distance from self and from opponent
+        components = self.resource_group_components
+        convolved_collectable = self.convolved_collectable_tiles_xy_set.to_matrix()
+        self.xy_to_resource_group_id.set_by_label(
+            components,
+            dist_from_player=components.min_by_label(self.distance_from_player_assets, convolved_collectable, 100),
+            dist_from_opponent=components.min_by_label(self.distance_from_opponent_assets, convolved_collectable, 100))
 
-        def get_median(arr):
-            arr = sorted(arr)
-            midpoint = len(arr)//2
-            return (arr[midpoint] + arr[~midpoint]) / 2
+        # calculating distances from every unit positions and its adjacent positions
+        # avoid blocked places as much as possible
+        self.positions_to_calculate_distances_from = set()
 
-        def calculate_distance_from_median(set_object):
-            # https://leetcode.com/problems/best-position-for-a-service-centre/discuss/733153/
-            if not set_object:
-                return self.init_matrix(default_value=0), Position(0,0)
+        self.path_distance_cache.start_pass(self.get_landmark_search)
+        self.distance_table: DistanceTable = None
+        self.direction_fields: Dict[Tuple[Tuple[int,int], bool], DirectionField] = {}
 
-            mx = get_median([x for x,y in set_object])
-            my = get_median([y for x,y in set_object])
 
-            matrix = self.init_matrix(default_value=0)
-            for y in self.y_iteration_order:
-                for x in self.x_iteration_order:
-                    matrix[y][x] = abs(x-mx) + abs(y-my)
+    def calculate_distance_from_set(self, xy_set):
+        return calculate_distance_fields(xy_sets_to_masks([xy_set], self.map_width, self.map_height))[0]
 
-            return matrix, Position(int(mx), int(my))
 
+    def get_median(self, arr):
+        arr = np.sort(arr)
+        midpoint = len(arr)//2
+        return (arr[midpoint] + arr[~midpoint]) / 2
 
-        def get_norm(p1, p2):
-            return (abs(p1[0] - p2[0]) + abs(p1[1] - p2[1]))
 
-        def calculate_distance_from_mean(set_object):
-            # https://leetcode.com/problems/best-position-for-a-service-centre/discuss/733153/
-            if not set_object:
-                return self.init_matrix(default_value=0), Position(0,0)
+    def get_coordinates(self, set_object) -> Tuple[np.ndarray, np.ndarray]:
+        # x and y coordinates of the tiles of the set on the map
+        ys, xs = np.nonzero(xy_sets_to_masks([set_object], self.map_width, self.map_height)[0])
+        return xs, ys
 
-            mx = sum(p[0] for p in set_object)/len(set_object)
-            my = sum(p[1] for p in set_object)/len(set_object)
 
-            matrix = self.init_matrix(default_value=0)
-            for y in self.y_iteration_order:
-                for x in self.x_iteration_order:
-                    matrix[y][x] = get_norm((x,y), (mx,my))
-
-            return matrix, Position(int(mx), int(my))
-
-        # calculate distance from resource (with projected research requirements)
-        self.distance_from_collectable_resource = calculate_distance_from_set(self.collectable_tiles_xy_set)
-        self.distance_from_collectable_resource_projected = calculate_distance_from_set(self.collectable_tiles_projected_xy_set)
-
-        # calculate distance from citytiles or units
-        self.distance_from_player_assets = calculate_distance_from_set(self.player_units_xy_set | self.player_city_tile_xy_set)
-        self.distance_from_opponent_assets = calculate_distance_from_set(self.opponent_units_xy_set | self.opponent_city_tile_xy_set)
-        self.distance_from_player_units = calculate_distance_from_set(self.player_units_xy_set)
-        self.distance_from_opponent_units = calculate_distance_from_set(self.opponent_units_xy_set)
-        self.distance_from_player_citytiles = calculate_distance_from_set(self.player_city_tile_xy_set)
-        self.distance_from_opponent_citytiles = calculate_distance_from_set(self.opponent_city_tile_xy_set)
-
-        self.distance_from_buildable_tile = calculate_distance_from_set(self.buildable_tile_xy_set)
-        self.distance_from_empty_tile = calculate_distance_from_set(self.empty_tile_xy_set)
-        self.distance_from_wood_tile = calculate_distance_from_set(self.wood_exist_xy_set)
-
-        self.distance_from_floodfill_by_player_city = calculate_distance_from_set(self.floodfill_by_player_city_set)
-        self.distance_from_floodfill_by_opponent_city = calculate_distance_from_set(self.floodfill_by_opponent_city_set)
-        self.distance_from_floodfill_by_either_city = calculate_distance_from_set(self.floodfill_by_either_city_set)
-        self.distance_from_floodfill_by_empty_tile = calculate_distance_from_set(self.floodfill_by_empty_tile_set)
+    def calculate_distance_from_point(self, mx, my) -> np.ndarray:
+        # the point may be between tiles, the distance is truncated to an integer
+        return (np.abs(self.map_geometry.x_grid - mx) + np.abs(self.map_geometry.y_grid - my)).astype(int)
+
+
+    def calculate_distance_from_median(self, set_object):
+        # https://leetcode.com/problems/best-position-for-a-service-centre/discuss/733153/
+        if not set_object:
+            return self.init_matrix(default_value=0), Position(0,0)
+
+        xs, ys = self.get_coordinates(set_object)
+        mx = self.get_median(xs)
+        my = self.get_median(ys)
+
+        matrix = self.calculate_distance_from_point(mx, my)
+        return matrix, Position(int(mx), int(my))
+
+
+    def calculate_distance_from_mean(self, set_object):
+        # https://leetcode.com/problems/best-position-for-a-service-centre/discuss/733153/
+        if not set_object:
+            return self.init_matrix(default_value=0), Position(0,0)
+
+        xs, ys = self.get_coordinates(set_object)
+        mx = int(xs.sum())/len(xs)
+        my = int(ys.sum())/len(ys)
+
+        matrix = self.calculate_distance_from_point(mx, my)
+        return matrix, Position(int(mx), int(my))
+
+
+    def calculate_side_matrices(self):
+        # positive if on empty cell and beside the resource
+        self.wood_side_matrix = self.convolve(self.wood_exist_matrix) * self.empty_tile_matrix
+        self.coal_side_matrix = self.convolve(self.coal_exist_matrix) * self.empty_tile_matrix
+        self.uranium_side_matrix = self.convolve(self.uranium_exist_matrix) * self.empty_tile_matrix
+
+
+    def calculate_convolved_two_opponent_assets(self):
+        self.convolved_two_opponent_assets_matrix = self.convolve_two(self.opponent_units_matrix + self.opponent_city_tile_matrix)
+
+
+    def calculate_floodfill_by_player_city(self):
+        self.floodfill_by_player_city_set = self.get_floodfill(self.player_city_tile_xy_set)
+        self.distance_from_floodfill_by_player_city = self.calculate_distance_from_set(self.floodfill_by_player_city_set)
+
+
+    def calculate_floodfill_by_opponent_city(self):
+        self.floodfill_by_opponent_city_set = self.get_floodfill(self.opponent_city_tile_xy_set)
+        self.distance_from_floodfill_by_opponent_city = self.calculate_distance_from_set(self.floodfill_by_opponent_city_set)
+
+
+    def calculate_floodfill_by_either_city(self):
+        self.floodfill_by_either_city_set = self.get_floodfill(self.player_city_tile_xy_set | self.opponent_city_tile_xy_set)
+        self.distance_from_floodfill_by_either_city = self.calculate_distance_from_set(self.floodfill_by_either_city_set)
+
+
+    def calculate_floodfill_by_empty_tile(self):
+        self.floodfill_by_empty_tile_set = self.get_floodfill(
+            self.player_city_tile_xy_set | self.opponent_city_tile_xy_set | self.wood_exist_xy_set | self.coal_exist_xy_set | self.uranium_exist_xy_set)
         if self.turn <= 20:
-            self.distance_from_floodfill_by_empty_tile = calculate_distance_from_set(self.buildable_tile_xy_set)
-        self.distance_from_preferred_buildable = calculate_distance_from_set(self.preferred_buildable_tile_xy_set)
-        self.distance_from_probably_buildable = calculate_distance_from_set(self.probably_buildable_tile_xy_set)
+            self.distance_from_floodfill_by_empty_tile = self.calculate_distance_from_set(self.buildable_tile_xy_set)
+        else:
+            self.distance_from_floodfill_by_empty_tile = self.calculate_distance_from_set(self.floodfill_by_empty_tile_set)
 
-        self.distance_from_resource_mean, self.resource_mean = calculate_distance_from_mean(self.collectable_tiles_xy_set)
-        self.distance_from_resource_median, self.resource_median = calculate_distance_from_median(self.collectable_tiles_xy_set)
-        self.distance_from_player_unit_median, self.player_unit_median = calculate_distance_from_median(self.player_units_xy_set)
-        self.distance_from_player_city_median, self.player_city_median = calculate_distance_from_median(self.player_city_tile_xy_set)
-        self.distance_from_preferred_median, self.player_preferred_median = calculate_distance_from_median(self.preferred_buildable_tile_xy_set)
 
-        # some features for blocking logic
-        self.opponent_unit_adjacent_xy_set: Set = set()
-        for y in self.y_iteration_order:
-            for x in self.x_iteration_order:
-                if self.distance_from_opponent_units[y,x] == 1:
-                    self.opponent_unit_adjacent_xy_set.add((x,y),)
-        self.opponent_unit_adjacent_and_buildable_xy_set: Set = self.opponent_unit_adjacent_xy_set & self.buildable_tile_xy_set
-        self.opponent_unit_adjacent_and_player_city_xy_set: Set = self.opponent_unit_adjacent_xy_set & self.player_city_tile_xy_set
-
-        # standardised distance from self
-        for x,y in self.convolved_collectable_tiles_xy_set:
-            leader = self.xy_to_resource_group_id.find((x,y),)
-            self.xy_to_resource_group_id.dist_from_player[leader] = min(self.xy_to_resource_group_id.get_dist_from_player((x,y),),
-                                                                        self.distance_from_player_assets[y,x])
-
-        # standardised distance from opponent
-        for x,y in self.convolved_collectable_tiles_xy_set:
-            leader = self.xy_to_resource_group_id.find((x,y),)
-            self.xy_to_resource_group_id.dist_from_opponent[leader] = min(self.xy_to_resource_group_id.get_dist_from_opponent((x,y),),
-                                                                          self.distance_from_opponent_assets[y,x])
+    def calculate_resource_centres(self):
+        self.distance_from_resource_mean, self.resource_mean = self.calculate_distance_from_mean(self.collectable_tiles_xy_set)
+        self.distance_from_resource_median, self.resource_median = self.calculate_distance_from_median(self.collectable_tiles_xy_set)
 
-        # calculating distances from every unit positions and its adjacent positions
-        # avoid blocked places as much as possible
-        self.positions_to_calculate_distances_from = set()
 
-        self.compute_distance_to_target_cache = {}
+    def calculate_player_unit_median(self):
+        self.distance_from_player_unit_median, self.player_unit_median = self.calculate_distance_from_median(self.player_units_xy_set)
 
 
-    def compute_distance_to_target(self,sx,sy):
-        if (sx,sy) in self.compute_distance_to_target_cache:
-            return self.compute_distance_to_target_cache[sx,sy]
+    def calculate_player_city_median(self):
+        self.distance_from_player_city_median, self.player_city_median = self.calculate_distance_from_median(self.player_city_tile_xy_set)
 
-        start_pos = (sx,sy)
-        xy_processed = set()
-        distance_to_target = {}
 
-        d4 = self.dirs_dxdy[:-1]
-        heap = [(0, start_pos),]
-        while heap:
-            curdist, (x,y) = heapq.heappop(heap)
-            if (x,y) in xy_processed:
-                continue
-            xy_processed.add((x,y),)
-            distance_to_target[x,y] = curdist
+    def calculate_preferred_median(self):
+        self.distance_from_preferred_median, self.player_preferred_median = self.calculate_distance_from_median(self.preferred_buildable_tile_xy_set)
+
+
+    def calculate_edge_lengths(self):
+        # cost of moving into each tile for the exact distances
+        return get_edge_lengths(
+            self.occupied_xy_set.to_matrix(),
+            self.opponent_city_tile_xy_set.to_matrix(),
+            self.matrix_player_cities_nights_of_fuel_required_for_game)
 
-            for dx,dy in d4:
-                xx,yy = x+dx,y+dy
-                if not (0 <= xx < self.map_width and 0 <= yy < self.map_height):
-                    continue
-                if (xx,yy) in xy_processed:
-                    continue
 
-                edge_length = 1
-                if (xx,yy) in self.occupied_xy_set:
-                    edge_length = 10
-                if (xx,yy) in self.opponent_city_tile_xy_set:
-                    edge_length = 50
-                if self.matrix_player_cities_nights_of_fuel_required_for_game[yy,xx] < 0:
-                    edge_length = 500
+    def get_landmark_search(self) -> LandmarkSearch:
+        # the corners of the map and the largest player cities, which the homing missions go to
+        # occupied tiles are left out of the edge lengths of the landmarks, they change while the actions are made
+        corners = [(0,0), (self.map_width-1,0), (0,self.map_height-1), (self.map_width-1,self.map_height-1)]
+        cities = sorted(self.player.cities.values(), key=lambda city: len(city.citytiles), reverse=True)[:4]
+        lower_edge_lengths = get_edge_lengths(
+            np.zeros((self.map_height, self.map_width), dtype=bool),
+            self.opponent_city_tile_xy_set.to_matrix(),
+            self.matrix_player_cities_nights_of_fuel_required_for_game)
+        return LandmarkSearch(self.map_geometry, lower_edge_lengths, corners + [tuple(city.citytiles[0].pos) for city in cities])
 
-                heapq.heappush(heap, (curdist + edge_length, (xx,yy)))
 
-        self.compute_distance_to_target_cache[sx,sy] = distance_to_target
-        return distance_to_target
+    def get_distance_table(self) -> DistanceTable:
+        # like for the path searches, the edge lengths are taken when the table is first used
+        if self.distance_table is None:
+            self.distance_table = DistanceTable(self.calculate_edge_lengths(), list(self.player_city_tile_xy_set))
+        return self.distance_table
+
+
+    def get_direction_field(self, target, use_exact=False) -> DirectionField:
+        # one field for each target in a pass, shared by the units moving there
+        # the exact distances come from the same backend as retrieve_distance, so the field and the distances agree
+        if (target, use_exact) not in self.direction_fields:
+            tx,ty = target
+            if use_exact and self.use_distance_table:
+                distances = self.get_distance_table().get_distances(target)
+            elif use_exact:
+                distances = self.path_distance_cache.get_search(target, self.calculate_edge_lengths).get_distances()
+            else:
+                distances = self.map_geometry.distance_between_tiles[ty,tx]
+            self.direction_fields[target, use_exact] = DirectionField(distances)
+        return self.direction_fields[target, use_exact]
 
 
     def retrieve_distance(self, sx, sy, ex, ey, use_exact=False):
         if use_exact:
-            return self.compute_distance_to_target(ex, ey)[sx,sy]
+            if self.use_distance_table:
+                return self.get_distance_table().get_distance(sx, sy, ex, ey)
+            return self.path_distance_cache.get_distance(sx, sy, ex, ey, self.calculate_edge_lengths)
 
         return abs(sx-ex) + abs(sy-ey)
 
 
     def convolve(self, matrix):
         # each worker gets resources from (up to) five tiles
-        new_matrix = matrix.copy()
-        new_matrix[:-1,:] += matrix[1:,:]
-        new_matrix[:,:-1] += matrix[:,1:]
-        new_matrix[1:,:] += matrix[:-1,:]
-        new_matrix[:,1:] += matrix[:,:-1]
-        return new_matrix
+        # the result may be shared with the features of this pass, do not modify it in place
+        return self.stencil.convolve(matrix, PLUS_KERNEL)
 
     def convolve_two(self, matrix):
-        # each worker gets resources from (up to) five tiles
-        new_matrix = matrix.copy()
-
-        new_matrix[:-1,:] += matrix[1:,:]
-        new_matrix[:,:-1] += matrix[:,1:]
-        new_matrix[1:,:] += matrix[:-1,:]
-        new_matrix[:,1:] += matrix[:,:-1]
-
-        new_matrix[:-1,:-1] += matrix[+1:,+1:]
-        new_matrix[:-1,+1:] += matrix[+1:,:-1]
-        new_matrix[+1:,:-1] += matrix[:-1,+1:]
-        new_matrix[+1:,+1:] += matrix[:-1,:-1]
-
-        new_matrix[:-2,:] += matrix[2:,:]
-        new_matrix[:,:-2] += matrix[:,2:]
-        new_matrix[2:,:] += matrix[:-2,:]
-        new_matrix[:,2:] += matrix[:,:-2]
-        return new_matrix
+        # tiles up to two steps away
+        return self.stencil.convolve(matrix, DIAMOND_KERNEL)
 
     def calculate_resource_matrix(self):
         # calculate value of the resource considering the reasearch level
@@ -926,20 +1151,16 @@ class Game:
             self.collectable_tiles_matrix_projected += self.uranium_exist_matrix
 
         # adjacent cells collect from the cell as well
-        self.convolved_collectable_tiles_matrix = self.convolve(self.collectable_tiles_matrix)
-        self.convolved_collectable_tiles_matrix_projected = self.convolve(self.collectable_tiles_matrix_projected)
-
-        self.resource_collection_rate = self.convolve(self.resource_collection_rate)
-        self.fuel_collection_rate = self.convolve(self.fuel_collection_rate)
+        self.convolved_collectable_tiles_matrix, self.convolved_collectable_tiles_matrix_projected, \
+            self.resource_collection_rate, self.fuel_collection_rate = self.stencil.convolve_batch("resource_collection", [
+                self.collectable_tiles_matrix, self.collectable_tiles_matrix_projected,
+                self.resource_collection_rate, self.fuel_collection_rate])
 
-        self.collectable_tiles_xy_set = set()  # exclude adjacent
-        self.populate_set(self.collectable_tiles_matrix, self.collectable_tiles_xy_set)
-        self.convolved_collectable_tiles_xy_set = set()  # include adjacent
-        self.populate_set(self.convolved_collectable_tiles_matrix, self.convolved_collectable_tiles_xy_set)
-        self.collectable_tiles_projected_xy_set = set()  # exclude adjacent
-        self.populate_set(self.collectable_tiles_matrix_projected, self.collectable_tiles_projected_xy_set)
-        self.convolved_collectable_tiles_projected_xy_set = set()  # include adjacent
-        self.populate_set(self.convolved_collectable_tiles_matrix_projected, self.convolved_collectable_tiles_projected_xy_set)
+        geometry = self.bitboard_geometry
+        self.collectable_tiles_xy_set = Bitboard.from_matrix(geometry, self.collectable_tiles_matrix)  # exclude adjacent
+        self.convolved_collectable_tiles_xy_set = Bitboard.from_matrix(geometry, self.convolved_collectable_tiles_matrix)  # include adjacent
+        self.collectable_tiles_projected_xy_set = Bitboard.from_matrix(geometry, self.collectable_tiles_matrix_projected)  # exclude adjacent
+        self.convolved_collectable_tiles_projected_xy_set = Bitboard.from_matrix(geometry, self.convolved_collectable_tiles_matrix_projected)  # include adjacent
 
         self.convolved_collectable_tiles_xy_set
         self.buildable_and_convolved_collectable_tile_xy_set = self.buildable_tile_xy_set & self.convolved_collectable_tiles_xy_set
@@ -967,114 +1188,61 @@ class Game:
         # compute join the resource cluster and calculate the amount of resource
         # clusters that are connected by a diagonal are considered to be a different resource
         # the cluster with more sources own more sides
+        collectable = self.collectable_tiles_matrix_projected > 0
+        convolved_collectable = self.convolved_collectable_tiles_matrix_projected > 0
+        player_city = self.player_city_tile_xy_set.to_matrix()
 
         # index individual resource tiles
-        self.xy_to_resource_group_id: DisjointSet = DisjointSet()
-        for y in self.y_iteration_order:
-            for x in self.x_iteration_order:
-                if (x,y) in self.convolved_collectable_tiles_projected_xy_set:
-                    if (x,y) in self.wood_exist_xy_set:
-                        self.xy_to_resource_group_id.find((x,y), point=1, tile=1)
-                    if (x,y) in self.coal_exist_xy_set:
-                        self.xy_to_resource_group_id.find((x,y), point=3, tile=1)
-                    if (x,y) in self.uranium_exist_xy_set:
-                        self.xy_to_resource_group_id.find((x,y), point=5, tile=1)
-                if (x,y) in self.convolved_collectable_tiles_projected_xy_set:
-                    if (x,y) in self.player_city_tile_xy_set:
-                        self.xy_to_resource_group_id.find((x,y), citytile=1)
+        resource_points = np.select([self.wood_exist_matrix > 0, self.coal_exist_matrix > 0, self.uranium_exist_matrix > 0], [1, 3, 5])
+        points = np.where(convolved_collectable, resource_points, 0)
+        tiles = (convolved_collectable & (resource_points > 0)).astype(int)
+        citytiles = (convolved_collectable & player_city).astype(int)
 
         # merge adjacent resource tiles and citytiles
-        for y in self.y_iteration_order:
-            for x in self.x_iteration_order:
-                if (x,y) in self.collectable_tiles_projected_xy_set:
-                    # if self.xy_to_resource_group_id.get_tiles((x,y)) > self.map_height/2:
-                    #     continue
-                    for dy,dx in self.dirs_dxdy[:-1]:
-                        xx, yy = x+dx, y+dy
-                        # if self.xy_to_resource_group_id.get_tiles((xx,yy)) > self.map_height/2:
-                        #     continue
-                        if 0 <= yy < self.map_height and 0 <= xx < self.map_width:
-                            if (xx,yy) in self.collectable_tiles_projected_xy_set:
-                                self.xy_to_resource_group_id.union((x,y), (xx,yy))
-                            if (xx,yy) in self.player_city_tile_xy_set:
-                                if self.xy_to_resource_group_id.get_tiles((xx,yy),) == 0:
-                                    self.xy_to_resource_group_id.union((x,y), (xx,yy))
-
         # consider resources two steps away as part of the cluster
-        for y in self.y_iteration_order:
-            for x in self.x_iteration_order:
-                if (x,y) in self.collectable_tiles_projected_xy_set:
-                    for dy1,dx1 in self.dirs_dxdy[:-1]:
-                        for dy2,dx2 in self.dirs_dxdy[:-1]:
-                            xx, yy = x+dx1+dx2, y+dy1+dy2
-                            if 0 <= yy < self.map_height and 0 <= xx < self.map_width:
-                                # if (xx,yy) in self.collectable_tiles_projected_xy_set:
-                                #     if self.xy_to_resource_group_id.get_tiles((xx,yy)) <= 2:
-                                        self.xy_to_resource_group_id.union((x,y), (xx,yy))
-
-        # absorb adjacent citytiles
-        for group in self.xy_to_resource_group_id.get_groups_sorted_by_citytile_size():
-            # might break symmetry
-            for x,y in group:
-                if (x,y) in self.collectable_tiles_projected_xy_set:
-                    for dy,dx in self.dirs_dxdy[:-1]:
-                        xx, yy = x+dx, y+dy
-                        if 0 <= yy < self.map_height and 0 <= xx < self.map_width:
-                            if (xx,yy) not in self.player_city_tile_xy_set:
-                                if self.xy_to_resource_group_id.find((xx,yy)) == (xx,yy):
-                                    self.xy_to_resource_group_id.union((x,y), (xx,yy))
-
-        # absorb adjacent buildable tiles
-        for group in self.xy_to_resource_group_id.get_groups_sorted_by_citytile_size():
-            # might break symmetry
-            for x,y in group:
-                if (x,y) in self.collectable_tiles_projected_xy_set:
-                    for dy,dx in self.dirs_dxdy[:-1]:
-                        xx, yy = x+dx, y+dy
-                        if 0 <= yy < self.map_height and 0 <= xx < self.map_width:
-                            if (xx,yy) not in self.collectable_tiles_projected_xy_set:
-                                if self.xy_to_resource_group_id.find((xx,yy)) == (xx,yy):
-                                    self.xy_to_resource_group_id.union((x,y), (xx,yy))
+        # absorb the other adjacent tiles, unless they are already two steps away from another resource
+        absorbable = ~collectable & ~player_city & ~any_at_offsets(collectable, TWO_STEPS_OFFSETS)
+        adjacent_joined = collectable | player_city | absorbable
+        everywhere = np.ones_like(collectable)
+        edges = [(dy, dx, collectable, adjacent_joined) for dy,dx in ADJACENT_OFFSETS]
+        edges += [(dy, dx, collectable, everywhere) for dy,dx in TWO_STEPS_OFFSETS]
+        components = ComponentLabels(self.iteration_rank, edges)
+
+        self.xy_to_resource_group_id: DisjointSet = DisjointSet.from_components(
+            components, points=components.sum_by_label(points),
+            tiles=components.sum_by_label(tiles), citytiles=components.sum_by_label(citytiles))
+        self.resource_group_components = components
 
 
     def repopulate_targets(self, missions: Missions):
         # with missions, populate the following objects for use
-        # probably these attributes belong to missions, but left it here to avoid circular imports
-        pos_list = missions.get_targets()
-        self.targeted_leaders: Set = set(self.xy_to_resource_group_id.find(tuple(pos)) for pos in pos_list)
+        # missions keeps the indexes of the targets, they are copied so that the objects stay as they were until the next call
+        if missions.resource_groups is not self.xy_to_resource_group_id or missions.units_by_id is not self.player.units_by_id:
+            missions.bind(self.xy_to_resource_group_id, self.player.units_by_id)
+            self.resource_leader_to_locating_units: DefaultDict[Tuple, Set[str]] = defaultdict(set)
+            self.located_unit_ids: Set[str] = set()
+
+        self.targeted_leaders: Set = set(missions.targeting_units_of_leader)
         self.targeted_cluster_count = sum(self.xy_to_resource_group_id.get_point((x,y)) > 0 for x,y in self.targeted_leaders)
 
-        self.targeted_xy_set: Set = set()
-        for mission in missions.values():
-            if mission.unit_id not in self.player.units_by_id:
-                continue
-            unit = self.player.units_by_id[mission.unit_id]
-            if unit.pos - mission.target_position > 5:
-                # do not store long range missions in targeted_xy_set
-                # however target cluster count is still considered
-                continue
-            self.targeted_xy_set.add(tuple(mission.target_position))
+        # do not store long range missions in targeted_xy_set
+        # however target cluster count is still considered
+        self.targeted_xy_set: Set = set(missions.nearby_units_of_target)
         self.targeted_xy_set -= self.player_city_tile_xy_set
 
-        pos_and_action_list = missions.get_targets_and_actions()
-        self.targeted_for_building_xy_set: Set = \
-            set(tuple(pos) for pos,action in pos_and_action_list if action and action[:5] == "bcity") - self.player_city_tile_xy_set
+        self.targeted_for_building_xy_set: Set = set(missions.units_of_build_target) - self.player_city_tile_xy_set
 
-        self.resource_leader_to_locating_units: DefaultDict[Tuple, Set[str]] = defaultdict(set)
+        # the units do not move during the turn, units are only added
         for unit_id in self.player.units_by_id:
+            if unit_id in self.located_unit_ids:
+                continue
             unit: Unit = self.player.units_by_id[unit_id]
-            current_position = tuple(unit.pos)
-            leader = self.xy_to_resource_group_id.find(current_position)
-            if leader:
-                self.resource_leader_to_locating_units[leader].add(unit_id)
-
-        self.resource_leader_to_targeting_units: DefaultDict[Tuple, Set[str]] = defaultdict(set)
-        for unit_id in missions:
-            mission: Mission = missions[unit_id]
-            target_position = tuple(mission.target_position)
-            leader = self.xy_to_resource_group_id.find(target_position)
-            if leader:
-                self.resource_leader_to_targeting_units[leader].add(unit_id)
+            leader = self.xy_to_resource_group_id.find(tuple(unit.pos))
+            self.resource_leader_to_locating_units[leader].add(unit_id)
+            self.located_unit_ids.add(unit_id)
+
+        self.resource_leader_to_targeting_units: DefaultDict[Tuple, Set[str]] = \
+            defaultdict(set, {leader: set(unit_ids) for leader, unit_ids in missions.targeting_units_of_leader.items()})
 
 
     def find_nearest_city_requiring_fuel(self, unit: Unit, require_reachable=True,
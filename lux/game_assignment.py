@@ -0,0 +1,106 @@
+import heapq
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+class MinCostFlow:
+    """
+    minimum cost flow by successive shortest paths, each path is found with Dijkstra on the costs reduced by potentials
+    edge e and its residual edge e^1 are stored next to each other, the costs of the edges added must not be negative
+    """
+    def __init__(self, num_nodes):
+        self.num_nodes = num_nodes
+        self.edges_of_node: List[List[int]] = [[] for _ in range(num_nodes)]
+        self.targets: List[int] = []
+        self.capacities: List[int] = []
+        self.costs: List[int] = []
+
+    def add_edge(self, source, target, capacity, cost) -> int:
+        edge = len(self.targets)
+        self.targets += [target, source]
+        self.capacities += [capacity, 0]
+        self.costs += [cost, -cost]
+        self.edges_of_node[source].append(edge)
+        self.edges_of_node[target].append(edge + 1)
+        return edge
+
+    def get_flow(self, edge) -> int:
+        return self.capacities[edge ^ 1]
+
+    def solve(self, source, sink, max_flow) -> Tuple[int, int]:
+        # returns the flow sent from the source to the sink and its cost
+        targets, capacities, costs = self.targets, self.capacities, self.costs
+        unreachable = float("inf")
+        potentials = [0] * self.num_nodes
+        flow, cost = 0, 0
+        while flow < max_flow:
+            distances = [unreachable] * self.num_nodes
+            previous_edge = [-1] * self.num_nodes
+            distances[source] = 0
+            queue = [(0, source)]
+            while queue:
+                distance, node = heapq.heappop(queue)
+                if distance > distances[node]:
+                    continue
+                for edge in self.edges_of_node[node]:
+                    if capacities[edge] <= 0:
+                        continue
+                    target = targets[edge]
+                    new_distance = distance + costs[edge] + potentials[node] - potentials[target]
+                    if new_distance < distances[target]:
+                        distances[target] = new_distance
+                        previous_edge[target] = edge
+                        heapq.heappush(queue, (new_distance, target))
+            if distances[sink] == unreachable:
+                break
+            for node in range(self.num_nodes):
+                if distances[node] < unreachable:
+                    potentials[node] += distances[node]
+
+            # push as much as the narrowest edge of the path allows
+            pushed = max_flow - flow
+            node = sink
+            while node != source:
+                edge = previous_edge[node]
+                pushed = min(pushed, capacities[edge])
+                node = targets[edge ^ 1]
+            node = sink
+            while node != source:
+                edge = previous_edge[node]
+                capacities[edge] -= pushed
+                capacities[edge ^ 1] += pushed
+                node = targets[edge ^ 1]
+            flow += pushed
+            cost += pushed * (potentials[sink] - potentials[source])
+        return flow, cost
+
+
+def assign_targets(preferences: List[List[Tuple[int, Hashable]]], unassigned_cost,
+                   group_of_target: Dict[Hashable, Hashable],
+                   target_capacity: Dict[Hashable, int], group_capacity: Dict[Hashable, int]) -> List[Optional[Hashable]]:
+    # each unit takes at most one target, preferences are the (cost, target) of each unit
+    # a unit that takes none of its targets costs unassigned_cost
+    # every target is in a group, a target or a group without a capacity can be taken by any number of units
+    # returns the target of each unit, None if the unit is left unassigned
+    targets = list(dict.fromkeys(target for choices in preferences for _, target in choices))
+    groups = list(dict.fromkeys(group_of_target[target] for target in targets))
+    node_of_target = {target: 2 + len(preferences) + index for index, target in enumerate(targets)}
+    node_of_group = {group: 2 + len(preferences) + len(targets) + index for index, group in enumerate(groups)}
+    source, sink = 0, 1
+    graph = MinCostFlow(2 + len(preferences) + len(targets) + len(groups))
+
+    edges_of_unit: List[List[Tuple[int, Hashable]]] = []
+    for unit_node, choices in enumerate(preferences, start=2):
+        graph.add_edge(source, unit_node, 1, 0)
+        graph.add_edge(unit_node, sink, 1, unassigned_cost)
+        edges_of_unit.append([(graph.add_edge(unit_node, node_of_target[target], 1, cost), target) for cost, target in choices])
+    for target in targets:
+        graph.add_edge(node_of_target[target], node_of_group[group_of_target[target]],
+                       target_capacity.get(target, len(preferences)), 0)
+    for group in groups:
+        graph.add_edge(node_of_group[group], sink, group_capacity.get(group, len(preferences)), 0)
+
+    graph.solve(source, sink, len(preferences))
+    assignment = []
+    for edges in edges_of_unit:
+        assignment.append(next((target for edge, target in edges if graph.get_flow(edge) > 0), None))
+    return assignment
@@ -0,0 +1,128 @@
+from typing import Iterable, Set, Tuple
+
+import numpy as np
+
+
+class BitboardGeometry:
+    """
+    map size and the iteration order used when a Bitboard is converted into a tuple set
+    the bitboards are padded by one tile on each side, so that tiles just outside the map can be stored
+    """
+    def __init__(self, width, height, x_iteration_order, y_iteration_order):
+        self.width = width
+        self.height = height
+        self.x_order = np.array([-1] + list(x_iteration_order) + [width]) + 1
+        self.y_order = np.array([-1] + list(y_iteration_order) + [height]) + 1
+
+
+class Bitboard:
+    """
+    set of (x,y) tiles stored as a boolean mask indexed [y+1,x+1]
+    membership and iteration use a tuple set that is built on first use, in the iteration order of the game
+    """
+    __slots__ = ("geometry", "mask", "_xy_set")
+
+    def __init__(self, geometry: BitboardGeometry, mask: np.ndarray = None):
+        self.geometry = geometry
+        if mask is None:
+            mask = np.zeros((geometry.height + 2, geometry.width + 2), dtype=bool)
+        self.mask: np.ndarray = mask
+        self._xy_set: Set[Tuple] = None
+
+    @classmethod
+    def from_matrix(cls, geometry: BitboardGeometry, matrix: np.ndarray) -> 'Bitboard':
+        # tiles where the matrix is positive
+        bitboard = cls(geometry)
+        bitboard.mask[1:-1,1:-1] = matrix > 0
+        return bitboard
+
+    @classmethod
+    def from_xy_set(cls, geometry: BitboardGeometry, xy_set: Iterable[Tuple]) -> 'Bitboard':
+        bitboard = cls(geometry)
+        for xy in xy_set:
+            bitboard.add(xy)
+        return bitboard
+
+    def to_matrix(self) -> np.ndarray:
+        # boolean matrix of the tiles on the map, this is a view of the mask
+        return self.mask[1:-1,1:-1]
+
+    def to_xy_set(self) -> Set[Tuple]:
+        # the returned set is kept up to date by add, remove and discard, do not modify it directly
+        if self._xy_set is None:
+            x_order, y_order = self.geometry.x_order, self.geometry.y_order
+            ys, xs = np.nonzero(self.mask[np.ix_(y_order, x_order)])
+            self._xy_set = set(zip((x_order[xs] - 1).tolist(), (y_order[ys] - 1).tolist()))
+        return self._xy_set
+
+    def __contains__(self, xy) -> bool:
+        xy_set = self._xy_set
+        if xy_set is None:
+            xy_set = self.to_xy_set()
+        return xy in xy_set
+
+    def __iter__(self):
+        return iter(self.to_xy_set())
+
+    def __len__(self) -> int:
+        if self._xy_set is not None:
+            return len(self._xy_set)
+        return int(np.count_nonzero(self.mask))
+
+    def __bool__(self) -> bool:
+        return bool(self.mask.any())
+
+    def _get_mask_of(self, other) -> np.ndarray:
+        # with a tuple set on the right it is converted, and the result is a bitboard
+        if isinstance(other, Bitboard):
+            return other.mask
+        if isinstance(other, (set, frozenset)):
+            return Bitboard.from_xy_set(self.geometry, other).mask
+        return None
+
+    def __or__(self, other) -> 'Bitboard':
+        mask = self._get_mask_of(other)
+        if mask is None:
+            return NotImplemented
+        return Bitboard(self.geometry, self.mask | mask)
+
+    def __and__(self, other) -> 'Bitboard':
+        mask = self._get_mask_of(other)
+        if mask is None:
+            return NotImplemented
+        return Bitboard(self.geometry, self.mask & mask)
+
+    def __sub__(self, other) -> 'Bitboard':
+        mask = self._get_mask_of(other)
+        if mask is None:
+            return NotImplemented
+        return Bitboard(self.geometry, self.mask & ~mask)
+
+    # with a tuple set on the left the result is a tuple set
+    def __ror__(self, other: Set[Tuple]) -> Set[Tuple]:
+        return other | self.to_xy_set()
+
+    def __rand__(self, other: Set[Tuple]) -> Set[Tuple]:
+        return other & self.to_xy_set()
+
+    def __rsub__(self, other: Set[Tuple]) -> Set[Tuple]:
+        return other - self.to_xy_set()
+
+    def add(self, xy):
+        x,y = xy
+        assert -1 <= x <= self.geometry.width and -1 <= y <= self.geometry.height
+        self.mask[y+1,x+1] = True
+        if self._xy_set is not None:
+            self._xy_set.add((x,y))
+
+    def remove(self, xy):
+        if xy not in self:
+            raise KeyError(xy)
+        self.discard(xy)
+
+    def discard(self, xy):
+        x,y = xy
+        if -1 <= x <= self.geometry.width and -1 <= y <= self.geometry.height:
+            self.mask[y+1,x+1] = False
+        if self._xy_set is not None:
+            self._xy_set.discard((x,y))
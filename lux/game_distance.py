@@ -0,0 +1,85 @@
+from typing import List, Set, Tuple
+
+import numpy as np
+
+from .game_bitboard import Bitboard
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# value of every tile when there is no source
+UNREACHABLE_DISTANCE = 99
+
+
+def xy_sets_to_masks(xy_sets: List[Set[Tuple]], width, height) -> np.ndarray:
+    # stack of boolean masks indexed [layer,y,x], positions outside the map are ignored
+    masks = np.zeros((len(xy_sets), height, width), dtype=bool)
+    for layer, xy_set in enumerate(xy_sets):
+        if isinstance(xy_set, Bitboard):
+            masks[layer] = xy_set.to_matrix()
+            continue
+        if not xy_set:
+            continue
+        xs, ys = np.array(list(xy_set)).T
+        inside = (0 <= xs) & (xs < width) & (0 <= ys) & (ys < height)
+        masks[layer, ys[inside], xs[inside]] = True
+    return masks
+
+
+def _min_plus_distance(values: np.ndarray, axis) -> np.ndarray:
+    # min over j of values[j] + |i-j| along the axis, in a forward and a backward pass
+    length = values.shape[axis]
+    shape = [1] * values.ndim
+    shape[axis] = length
+    index = np.arange(length).reshape(shape)
+    forward = np.minimum.accumulate(values - index, axis=axis) + index
+    backward = np.flip(np.minimum.accumulate(np.flip(values + index, axis=axis), axis=axis), axis=axis) - index
+    return np.minimum(forward, backward)
+
+
+def calculate_distance_fields_numpy(masks: np.ndarray) -> np.ndarray:
+    # the Manhattan distance is separable, the distance along x is computed first then along y
+    infinity = sum(masks.shape[1:]) + UNREACHABLE_DISTANCE
+    distances = np.where(masks, 0, infinity)
+    distances = _min_plus_distance(distances, axis=2)
+    distances = _min_plus_distance(distances, axis=1)
+    distances[distances >= infinity] = UNREACHABLE_DISTANCE
+    return distances
+
+
+if numba is not None:
+    @numba.njit
+    def _calculate_distance_fields_numba(masks, infinity):
+        # two raster scans, which is exact for four-connected grids without obstacles
+        layers, height, width = masks.shape
+        distances = np.empty((layers, height, width), dtype=np.int64)
+        for layer in range(layers):
+            for y in range(height):
+                for x in range(width):
+                    distance = 0 if masks[layer,y,x] else infinity
+                    if y > 0:
+                        distance = min(distance, distances[layer,y-1,x] + 1)
+                    if x > 0:
+                        distance = min(distance, distances[layer,y,x-1] + 1)
+                    distances[layer,y,x] = distance
+            for y in range(height-1, -1, -1):
+                for x in range(width-1, -1, -1):
+                    distance = distances[layer,y,x]
+                    if y < height-1:
+                        distance = min(distance, distances[layer,y+1,x] + 1)
+                    if x < width-1:
+                        distance = min(distance, distances[layer,y,x+1] + 1)
+                    distances[layer,y,x] = distance
+        return distances
+
+    def calculate_distance_fields_numba(masks: np.ndarray) -> np.ndarray:
+        infinity = sum(masks.shape[1:]) + UNREACHABLE_DISTANCE
+        distances = _calculate_distance_fields_numba(masks, infinity)
+        distances[distances >= infinity] = UNREACHABLE_DISTANCE
+        return distances
+
+    calculate_distance_fields = calculate_distance_fields_numba
+else:
+    calculate_distance_fields = calculate_distance_fields_numpy
@@ -0,0 +1,52 @@
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+class MapGeometry:
+    """
+    features that only depend on the size of the map, computed once for each map size
+    the arrays are shared by every game of that size and are made read-only
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+        # coordinates of the columns and of the rows, they broadcast into matrices indexed [y,x]
+        self.x_grid: np.ndarray = np.arange(width)[None,:]
+        self.y_grid: np.ndarray = np.arange(height)[:,None]
+
+        # the x term is also measured from map_height, which is the same on the square maps of the game
+        self.distance_from_edge: np.ndarray = \
+            np.minimum(self.y_grid, height - self.y_grid - 1) + np.minimum(self.x_grid, height - self.x_grid - 1)
+
+        # tiles just outside the map excluding the corners, in the padded layout of Bitboard
+        self.out_of_map_mask: np.ndarray = np.zeros((height + 2, width + 2), dtype=bool)
+        self.out_of_map_mask[[0,-1],1:-1] = True
+        self.out_of_map_mask[1:-1,[0,-1]] = True
+
+        # Manhattan distance between two tiles, indexed [y1,x1,y2,x2]
+        self.distance_between_tiles: np.ndarray = (
+            np.abs(self.y_grid[:,:,None,None] - self.y_grid[None,None,:,:]) +
+            np.abs(self.x_grid[:,:,None,None] - self.x_grid[None,None,:,:])).astype(np.int16)
+
+        # flat indices y*width+x of the tiles adjacent to each tile, in the order north, east, south, west
+        self.adjacent_tiles: Tuple[Tuple[int, ...], ...] = tuple(
+            tuple((y+dy) * width + (x+dx) for dx,dy in [(0,-1), (1,0), (0,1), (-1,0)] if 0 <= x+dx < width and 0 <= y+dy < height)
+            for y in range(height) for x in range(width))
+
+        for array in [self.x_grid, self.y_grid, self.distance_from_edge, self.out_of_map_mask, self.distance_between_tiles]:
+            array.flags.writeable = False
+
+    def __reduce__(self):
+        # saved with the game_state by map size, the arrays are rebuilt or taken from the cache when loaded
+        return get_map_geometry, (self.width, self.height)
+
+
+map_geometries: Dict[Tuple[int, int], MapGeometry] = {}
+
+
+def get_map_geometry(width, height) -> MapGeometry:
+    if (width, height) not in map_geometries:
+        map_geometries[width, height] = MapGeometry(width, height)
+    return map_geometries[width, height]
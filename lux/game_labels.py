@@ -0,0 +1,110 @@
+from typing import List, Tuple
+
+import numpy as np
+
+# offsets (dy,dx) of the four adjacent tiles
+ADJACENT_OFFSETS = [(0,-1), (1,0), (0,1), (-1,0)]
+
+
+def get_offsets_at_distance(distances) -> List[Tuple[int,int]]:
+    # offsets (dy,dx) whose Manhattan distance is one of the given distances
+    radius = max(distances)
+    return [(dy,dx) for dy in range(-radius, radius+1) for dx in range(-radius, radius+1)
+            if abs(dy) + abs(dx) in distances]
+
+
+# offsets (dy,dx) of the tiles that are two steps away
+TWO_STEPS_OFFSETS = get_offsets_at_distance([2])
+
+
+def get_iteration_rank(width, height, x_iteration_order, y_iteration_order) -> np.ndarray:
+    # position of each tile in the iteration order of the game (y outer, x inner), indexed [y,x]
+    x_rank = np.empty(width, dtype=int)
+    x_rank[list(x_iteration_order)] = np.arange(width)
+    y_rank = np.empty(height, dtype=int)
+    y_rank[list(y_iteration_order)] = np.arange(height)
+    return y_rank[:,None] * width + x_rank[None,:]
+
+
+def _overlapping_slices(dy, dx, height, width):
+    # tile [y,x] of the first slice and tile [y+dy,x+dx] of the second slice are both on the map
+    source = (slice(max(0,-dy), height - max(0,dy)), slice(max(0,-dx), width - max(0,dx)))
+    target = (slice(max(0,dy), height + min(0,dy)), slice(max(0,dx), width + min(0,dx)))
+    return source, target
+
+
+def any_at_offsets(mask: np.ndarray, offsets) -> np.ndarray:
+    # tiles that have a tile of the mask at one of the offsets
+    height, width = mask.shape
+    result = np.zeros_like(mask)
+    for dy, dx in offsets:
+        source, target = _overlapping_slices(dy, dx, height, width)
+        result[source] |= mask[target]
+    return result
+
+
+class ComponentLabels:
+    """
+    connected components of the tiles of the map, computed with array operations
+    edges are given as (dy, dx, source_mask, target_mask), which connects tile (x,y) with tile (x+dx,y+dy)
+    when source_mask[y,x] and target_mask[y+dy,x+dx] are both true
+    the label of a component is the rank of its first tile in the iteration order, so the labels run from 0 to width*height
+    a tile without any edge is a component by itself
+    """
+    def __init__(self, rank: np.ndarray, edges: List[Tuple[int, int, np.ndarray, np.ndarray]]):
+        self.rank = rank
+        height, width = rank.shape
+        self.tile_of_rank: np.ndarray = np.argsort(rank, axis=None)  # flat index y*width+x of the tile with the rank
+
+        # flat indices of the two tiles of each edge
+        tile_index = np.arange(height * width).reshape(height, width)
+        sources, targets = [], []
+        for dy, dx, source_mask, target_mask in edges:
+            source, target = _overlapping_slices(dy, dx, height, width)
+            connected = source_mask[source] & target_mask[target]
+            sources.append(tile_index[source][connected])
+            targets.append(tile_index[target][connected])
+        sources = np.concatenate(sources) if sources else np.zeros(0, dtype=int)
+        targets = np.concatenate(targets) if targets else np.zeros(0, dtype=int)
+
+        # the label of a tile is always the rank of a tile in the same component whose label is not larger
+        # the tile referred to by the larger label of an edge takes the smaller label, then each tile follows
+        # the labels until it reaches a tile that is labelled with its own rank
+        labels = rank.ravel().copy()
+        while True:
+            source_labels, target_labels = labels[sources], labels[targets]
+            differs = source_labels != target_labels
+            if not differs.any():
+                break
+            smaller = np.minimum(source_labels[differs], target_labels[differs])
+            larger = np.maximum(source_labels[differs], target_labels[differs])
+            np.minimum.at(labels, self.tile_of_rank[larger], smaller)
+            while True:
+                followed = labels[self.tile_of_rank[labels]]
+                if np.array_equal(followed, labels):
+                    break
+                labels = followed
+        self.labels: np.ndarray = labels.reshape(height, width)
+
+        self.sizes: np.ndarray = self.sum_by_label()
+
+    def sum_by_label(self, values: np.ndarray = None) -> np.ndarray:
+        # sum of the values of the tiles of each label, counts the tiles if no values are given
+        if values is None:
+            return np.bincount(self.labels.ravel(), minlength=self.labels.size)
+        return np.bincount(self.labels.ravel(), weights=values.ravel(), minlength=self.labels.size).astype(values.dtype)
+
+    def min_by_label(self, values: np.ndarray, mask: np.ndarray, initial) -> np.ndarray:
+        # smallest value of the tiles in the mask of each label, initial if the label has no tile in the mask
+        minimum = np.full(self.labels.size, initial, dtype=values.dtype)
+        np.minimum.at(minimum, self.labels[mask], values[mask])
+        return minimum
+
+    def get_mask_of_labels(self, labels) -> np.ndarray:
+        return np.isin(self.labels, labels)
+
+    def get_leader_xy(self, label) -> Tuple[int,int]:
+        # the first tile of the component in the iteration order
+        y, x = divmod(int(self.tile_of_rank[label]), self.labels.shape[1])
+        return x, y
+
@@ -1,5 +1,7 @@
 import math, random
-from typing import List, Set, Tuple
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
 
 from .constants import Constants
 from .game_objects import CityTile, Unit
@@ -7,14 +9,22 @@ from .game_position import Position
 
 RESOURCE_TYPES = Constants.RESOURCE_TYPES
 
+# index of each resource type in ArrayGameMap.resource_type, -1 is no resource
+RESOURCE_TYPE_NAMES = [RESOURCE_TYPES.WOOD, RESOURCE_TYPES.COAL, RESOURCE_TYPES.URANIUM]
+RESOURCE_TYPE_CODES = {r_type: code for code, r_type in enumerate(RESOURCE_TYPE_NAMES)}
+
 
 class Resource:
+    __slots__ = ("type", "amount")
+
     def __init__(self, r_type: str, amount: int):
         self.type = r_type
         self.amount = amount
 
 
 class Cell:
+    __slots__ = ("pos", "resource", "citytile", "unit", "road")
+
     def __init__(self, x, y):
         self.pos = Position(x, y)
         self.resource: Resource = None
@@ -55,3 +65,190 @@ class GameMap:
         """
         cell = self.get_cell(x, y)
         cell.resource = Resource(r_type, amount)
+
+    def _removeResource(self, x, y):
+        """
+        do not use this function, this is for internal tracking of state
+        """
+        self.get_cell(x, y).resource = None
+
+    def _setRoad(self, x, y, road):
+        """
+        do not use this function, this is for internal tracking of state
+        """
+        self.get_cell(x, y).road = road
+
+    def _setUnit(self, x, y, unit):
+        """
+        do not use this function, this is for internal tracking of state
+        """
+        self.get_cell(x, y).unit = unit
+
+    def _removeUnits(self, x, y):
+        """
+        do not use this function, this is for internal tracking of state
+        """
+        self.get_cell(x, y).unit = None
+
+    def _setCityTile(self, x, y, citytile):
+        """
+        do not use this function, this is for internal tracking of state
+        """
+        self.get_cell(x, y).citytile = citytile
+
+    def _removeCityTile(self, x, y):
+        """
+        do not use this function, this is for internal tracking of state
+        """
+        self.get_cell(x, y).citytile = None
+
+    def get_resource_amount_matrix(self, r_type=None) -> np.ndarray:
+        # amount of resource of r_type (or of any type) on each tile, indexed [y,x]
+        matrix = np.zeros((self.height, self.width), dtype=int)
+        for y in range(self.height):
+            for x in range(self.width):
+                cell = self.map[y][x]
+                if cell.has_resource() and (r_type is None or cell.resource.type == r_type):
+                    matrix[y,x] = cell.resource.amount
+        return matrix
+
+    def get_citytile_team_matrix(self) -> np.ndarray:
+        # team of the citytile on each tile, -1 if there is no citytile
+        matrix = np.full((self.height, self.width), -1, dtype=int)
+        for y in range(self.height):
+            for x in range(self.width):
+                if self.map[y][x].citytile:
+                    matrix[y,x] = self.map[y][x].citytile.team
+        return matrix
+
+    def get_unit_exist_matrix(self) -> np.ndarray:
+        matrix = np.zeros((self.height, self.width), dtype=bool)
+        for y in range(self.height):
+            for x in range(self.width):
+                matrix[y,x] = self.map[y][x].unit is not None
+        return matrix
+
+    def get_road_matrix(self) -> np.ndarray:
+        matrix = np.zeros((self.height, self.width), dtype=float)
+        for y in range(self.height):
+            for x in range(self.width):
+                matrix[y,x] = self.map[y][x].road
+        return matrix
+
+
+class ArrayGameMap:
+    """
+    GameMap stored as flat arrays indexed by y*width + x
+    get_cell and get_cell_by_pos build a Cell from the arrays, assigning to that Cell does not change the map
+    """
+    def __init__(self, width, height):
+        self.height = height
+        self.width = width
+        size = width * height
+
+        self.resource_type = np.full(size, -1, dtype=np.int8)   # index into RESOURCE_TYPE_NAMES
+        self.resource_amount = np.zeros(size, dtype=int)
+        self.road = np.zeros(size, dtype=float)
+        self.citytile_team = np.full(size, -1, dtype=np.int8)
+        self.citytile_cityid_index = np.full(size, -1, dtype=np.int32)   # index into self.cityids
+        self.unit_count = np.zeros(size, dtype=np.int16)
+
+        self.cityids: List[str] = []
+        self.cityid_index: Dict[str, int] = {}
+        self.citytiles: Dict[int, CityTile] = {}
+        self.units: Dict[int, Unit] = {}   # the last unit reported on the tile
+
+    def get_cell_by_pos(self, pos) -> Cell:
+        return self.get_cell(pos.x, pos.y)
+
+    def get_cell(self, x, y) -> Cell:
+        i = y * self.width + x
+        cell = Cell(x, y)
+        if self.resource_type[i] >= 0:
+            cell.resource = Resource(RESOURCE_TYPE_NAMES[self.resource_type[i]], int(self.resource_amount[i]))
+        cell.citytile = self.citytiles.get(i)
+        cell.unit = self.units.get(i)
+        cell.road = float(self.road[i])
+        return cell
+
+    def get_cityid_of_cell(self, x, y) -> str:
+        cityid_index = self.citytile_cityid_index[y * self.width + x]
+        if cityid_index < 0:
+            return None
+        return self.cityids[cityid_index]
+
+    def _setResource(self, r_type, x, y, amount):
+        """
+        do not use this function, this is for internal tracking of state
+        """
+        i = y * self.width + x
+        self.resource_type[i] = RESOURCE_TYPE_CODES[r_type]
+        self.resource_amount[i] = amount
+
+    def _removeResource(self, x, y):
+        """
+        do not use this function, this is for internal tracking of state
+        """
+        i = y * self.width + x
+        self.resource_type[i] = -1
+        self.resource_amount[i] = 0
+
+    def _setRoad(self, x, y, road):
+        """
+        do not use this function, this is for internal tracking of state
+        """
+        self.road[y * self.width + x] = road
+
+    def _setUnit(self, x, y, unit):
+        """
+        do not use this function, this is for internal tracking of state
+        """
+        i = y * self.width + x
+        self.units[i] = unit
+        self.unit_count[i] += 1
+
+    def _removeUnits(self, x, y):
+        """
+        do not use this function, this is for internal tracking of state
+        """
+        i = y * self.width + x
+        self.units.pop(i, None)
+        self.unit_count[i] = 0
+
+    def _setCityTile(self, x, y, citytile):
+        """
+        do not use this function, this is for internal tracking of state
+        """
+        i = y * self.width + x
+        if citytile.cityid not in self.cityid_index:
+            self.cityid_index[citytile.cityid] = len(self.cityids)
+            self.cityids.append(citytile.cityid)
+        self.citytiles[i] = citytile
+        self.citytile_team[i] = citytile.team
+        self.citytile_cityid_index[i] = self.cityid_index[citytile.cityid]
+
+    def _removeCityTile(self, x, y):
+        """
+        do not use this function, this is for internal tracking of state
+        """
+        i = y * self.width + x
+        self.citytiles.pop(i, None)
+        self.citytile_team[i] = -1
+        self.citytile_cityid_index[i] = -1
+
+    def get_resource_amount_matrix(self, r_type=None) -> np.ndarray:
+        # amount of resource of r_type (or of any type) on each tile, indexed [y,x]
+        has_resource = (self.resource_type >= 0) & (self.resource_amount > 0)
+        if r_type is not None:
+            has_resource &= self.resource_type == RESOURCE_TYPE_CODES[r_type]
+        return np.where(has_resource, self.resource_amount, 0).reshape(self.height, self.width)
+
+    def get_citytile_team_matrix(self) -> np.ndarray:
+        # team of the citytile on each tile, -1 if there is no citytile
+        return self.citytile_team.reshape(self.height, self.width).astype(int)
+
+    def get_unit_exist_matrix(self) -> np.ndarray:
+        return (self.unit_count > 0).reshape(self.height, self.width)
+
+    def get_road_matrix(self) -> np.ndarray:
+        return self.road.reshape(self.height, self.width)
@@ -0,0 +1,83 @@
+import heapq
+from collections import defaultdict
+from typing import DefaultDict, Dict, Iterator, List, Set, Tuple
+
+import numpy as np
+
+from .game_bitboard import Bitboard
+from .game_objects import Unit
+
+
+class MoveCandidates:
+    """
+    the tiles that each unit of a batch can move into, indexed [unit, direction] with the directions of Game.dirs
+    features of the tiles are gathered for all the units at once
+    tiles outside the map take the feature of the closest tile on the map, they are marked by inside_map
+    """
+    def __init__(self, units: List[Unit], dirs_dxdy: List[Tuple[int,int]], width, height):
+        self.row_of_unit = {unit.id: row for row, unit in enumerate(units)}
+        dxs, dys = np.array(dirs_dxdy, dtype=int).reshape(-1, 2).T
+        unit_xs = np.array([unit.pos.x for unit in units], dtype=int)
+        unit_ys = np.array([unit.pos.y for unit in units], dtype=int)
+        self.xs: np.ndarray = unit_xs[:,None] + dxs[None,:]
+        self.ys: np.ndarray = unit_ys[:,None] + dys[None,:]
+        self.inside_map: np.ndarray = (0 <= self.xs) & (self.xs < width) & (0 <= self.ys) & (self.ys < height)
+        self._clipped_xs = np.clip(self.xs, 0, width - 1)
+        self._clipped_ys = np.clip(self.ys, 0, height - 1)
+        self._unit_xs, self._unit_ys = unit_xs, unit_ys
+
+    def gather(self, matrix: np.ndarray, rows=slice(None)) -> np.ndarray:
+        # value of the matrix at each candidate tile, of all the units or of the given rows
+        return matrix[self._clipped_ys[rows], self._clipped_xs[rows]]
+
+    def gather_bitboard(self, bitboard: Bitboard) -> np.ndarray:
+        # whether each candidate tile is in the set, the tiles just outside the map are looked up as well
+        return bitboard.mask[self.ys + 1, self.xs + 1]
+
+    def gather_unit_tile(self, matrix: np.ndarray) -> np.ndarray:
+        # value of the matrix at the tile of each unit, shaped to be compared with the candidate tiles
+        return matrix[self._unit_ys, self._unit_xs][:,None]
+
+
+class MoveQueue:
+    """
+    the order in which make_unit_actions evaluates the units, by (pass, index of the unit in the list)
+    a unit that stays waits on the tiles it could move into, the reservation map keeps the units waiting on each tile
+    when a tile is taken or freed, the units waiting on it are evaluated again, in the current pass if they come later
+    in the list and in the next pass otherwise, which is the order of repeating passes over all the units
+    """
+    def __init__(self, units: List[Unit], dirs_dxdy: List[Tuple[int,int]]):
+        self.units = units
+        self.dirs_dxdy = dirs_dxdy
+        self.queue: List[Tuple[int,int]] = [(0, index) for index in range(len(units))]
+        self.queued: Set[Tuple[int,int]] = set(self.queue)
+        self.units_waiting_on_tile: DefaultDict[Tuple[int,int], Set[int]] = defaultdict(set)
+        self.waiting: Set[int] = set()
+        self.current: Tuple[int,int] = (0, -1)
+
+    def __iter__(self) -> Iterator[Tuple[int, Unit]]:
+        while self.queue:
+            self.current = heapq.heappop(self.queue)
+            self.queued.discard(self.current)
+            _, index = self.current
+            self.waiting.discard(index)
+            yield index, self.units[index]
+
+    def wait(self, index):
+        # the unit stays until one of the tiles it could move into is taken or freed
+        self.waiting.add(index)
+        unit = self.units[index]
+        for dx,dy in self.dirs_dxdy:
+            self.units_waiting_on_tile[unit.pos.x + dx, unit.pos.y + dy].add(index)
+
+    def wake(self, tiles: List[Tuple[int,int]]):
+        # queue the units waiting on the tiles that the unit being evaluated has taken or freed
+        current_pass, current_index = self.current
+        for tile in tiles:
+            for index in self.units_waiting_on_tile.get(tile, ()):
+                if index not in self.waiting:
+                    continue
+                key = (current_pass, index) if index > current_index else (current_pass + 1, index)
+                if key not in self.queued:
+                    self.queued.add(key)
+                    heapq.heappush(self.queue, key)
@@ -42,6 +42,9 @@ class Player:
 
 
 class City:
+    __slots__ = ("cityid", "team", "fuel", "citytiles", "light_upkeep",
+                 "night_fuel_duration", "fuel_needed_for_game", "fuel_needed_for_night")
+
     def __init__(self, teamid, cityid, fuel, light_upkeep, night_turns_left):
         self.cityid = cityid
         self.team = teamid
@@ -60,11 +63,21 @@ class City:
         self.citytiles.append(ct)
         return ct
 
+    def _reuse_city_tile(self, ct, cooldown):
+        """
+        do not use this function, this is for internal tracking of state
+        """
+        ct.cooldown = cooldown
+        self.citytiles.append(ct)
+        return ct
+
     def get_light_upkeep(self):
         return self.light_upkeep
 
 
 class CityTile:
+    __slots__ = ("cityid", "team", "pos", "cooldown")
+
     def __init__(self, teamid, cityid, x, y, cooldown):
         self.cityid = cityid
         self.team = teamid
@@ -97,6 +110,8 @@ class CityTile:
 
 
 class Cargo:
+    __slots__ = ("wood", "coal", "uranium")
+
     def __init__(self):
         self.wood: int = 0
         self.coal: int = 0
@@ -139,6 +154,9 @@ class Cargo:
 
 
 class Unit:
+    __slots__ = ("pos", "team", "id", "type", "cooldown", "cargo", "fuel_potential", "use_rule_base",
+                 "night_turn_survivable", "night_travel_range", "travel_range")
+
     def __init__(self, teamid, u_type, unitid, x, y, cooldown, wood, coal, uranium):
         self.pos = Position(x, y)
         self.team = teamid
@@ -153,6 +171,22 @@ class Unit:
         self.use_rule_base = False
         self.compute_travel_range()
 
+    def _update(self, x, y, cooldown, wood, coal, uranium):
+        """
+        do not use this function, this is for internal tracking of state
+        resets everything the agent may have simulated on the unit in the previous turn
+        """
+        if self.pos.x != x or self.pos.y != y:
+            # missions may hold a reference to the old position, do not modify in place
+            self.pos = Position(x, y)
+        self.cooldown = cooldown
+        self.cargo.wood = wood
+        self.cargo.coal = coal
+        self.cargo.uranium = uranium
+        self.fuel_potential = wood*1 + coal*5 + uranium*20
+        self.use_rule_base = False
+        self.compute_travel_range()
+
     def is_worker(self) -> bool:
         return self.type == UNIT_TYPES.WORKER
 
@@ -0,0 +1,404 @@
+import abc
+import heapq
+from collections import OrderedDict, defaultdict
+from typing import Callable, DefaultDict, Dict, List, Tuple
+
+import numpy as np
+
+from .game_geometry import MapGeometry
+
+# cost of moving into a tile, a tile takes the last of these that applies to it
+EDGE_LENGTH_EMPTY = 1
+EDGE_LENGTH_OCCUPIED = 10
+EDGE_LENGTH_OPPONENT_CITY = 50
+EDGE_LENGTH_FUELED_CITY = 500
+
+# larger than any path on the map, and can still be added to without overflow
+UNREACHABLE = 1 << 28
+
+
+def get_edge_lengths(occupied: np.ndarray, opponent_city: np.ndarray, nights_of_fuel_required: np.ndarray) -> np.ndarray:
+    # cost of moving into each tile, indexed [y,x]
+    edge_lengths = np.full(occupied.shape, EDGE_LENGTH_EMPTY, dtype=np.int32)
+    edge_lengths[occupied] = EDGE_LENGTH_OCCUPIED
+    edge_lengths[opponent_city] = EDGE_LENGTH_OPPONENT_CITY
+    edge_lengths[nights_of_fuel_required < 0] = EDGE_LENGTH_FUELED_CITY
+    return edge_lengths
+
+
+def _sweep(distances: np.ndarray, edge_lengths: np.ndarray, axis: int):
+    # relax every path that only moves along the axis, forwards and then backwards, in place
+    # the lines are visited in the order of the moves, so a path is relaxed over its whole length in one sweep
+    lines = np.moveaxis(distances, axis, 0)
+    line_lengths = np.moveaxis(edge_lengths, axis, 0)
+    length = lines.shape[0]
+    for i in range(1, length):
+        np.minimum(lines[i], lines[i-1] + line_lengths[i], out=lines[i])
+    for i in range(length-2, -1, -1):
+        np.minimum(lines[i], lines[i+1] + line_lengths[i], out=lines[i])
+
+
+def calculate_weighted_distances(edge_lengths: np.ndarray, targets: List[Tuple[int,int]]) -> np.ndarray:
+    """
+    length of the shortest path from each target to every tile, indexed [y,x,target]
+    a path is charged the edge length of every tile it moves into
+    all targets are computed together, sweeping along the rows and the columns in both directions until no distance improves
+    the targets are the last axis, so that every line of a sweep is a contiguous run of memory
+    """
+    height, width = edge_lengths.shape
+    distances = np.full((height, width, len(targets)), UNREACHABLE, dtype=np.int32)
+    if not targets:
+        return distances
+    xs, ys = zip(*targets)
+    distances[ys, xs, np.arange(len(targets))] = 0
+
+    edge_lengths = edge_lengths[:,:,None]
+    while True:
+        previous = distances.copy()
+        _sweep(distances, edge_lengths, 0)
+        _sweep(distances, edge_lengths, 1)
+        if np.array_equal(previous, distances):
+            return distances
+
+
+class DistanceTable:
+    """
+    exact path distances to a batch of targets, computed together with the edge lengths given at construction
+    targets added later are computed with the same edge lengths
+    """
+    def __init__(self, edge_lengths: np.ndarray, targets: List[Tuple[int,int]] = ()):
+        height, width = edge_lengths.shape
+        self.width = width
+        self.edge_lengths = edge_lengths
+
+        # row of the table for each tile, -1 if the tile is not a target
+        self.row_of_target: np.ndarray = np.full(height * width, -1, dtype=int)
+        # indexed [source tile, target row], with the flat index y*width+x of the tile
+        self.distances: np.ndarray = np.zeros((height * width, 0), dtype=np.int32)
+        self.add_targets(targets)
+
+    def add_targets(self, targets: List[Tuple[int,int]]):
+        targets = [(x,y) for x,y in dict.fromkeys(targets) if (x,y) not in self]
+        if not targets:
+            return
+        for row, (x,y) in enumerate(targets, start=self.distances.shape[1]):
+            self.row_of_target[y * self.width + x] = row
+        distances = calculate_weighted_distances(self.edge_lengths, targets).reshape(self.distances.shape[0], len(targets))
+        self.distances = np.concatenate([self.distances, distances], axis=1)
+
+    def __contains__(self, target) -> bool:
+        x,y = target
+        return self.row_of_target[y * self.width + x] >= 0
+
+    def get_row(self, target) -> int:
+        # the target is added if it is not in the table
+        x,y = target
+        if target not in self:
+            self.add_targets([(x,y)])
+        return self.row_of_target[y * self.width + x]
+
+    def get_distance(self, sx, sy, ex, ey) -> int:
+        # from tile (sx,sy) to the target (ex,ey)
+        row = self.get_row((ex,ey))
+        return int(self.distances[sy * self.width + sx, row])
+
+    def get_distances(self, target) -> np.ndarray:
+        # distance of every tile to the target, indexed [y,x]
+        row = self.get_row(target)
+        return self.distances[:, row].reshape(-1, self.width)
+
+
+class PathSearch(abc.ABC):
+    """
+    shortest paths from a target that are settled on demand, the kernels differ in how the next tile is settled
+    the edge lengths of the explored tiles are the only ones the settled distances depend on
+    """
+    def __init__(self, geometry: MapGeometry, target, edge_lengths: np.ndarray):
+        x,y = target
+        self.geometry = geometry
+        self.target_tile = y * geometry.width + x
+        self.edge_lengths: List[int] = edge_lengths.ravel().tolist()
+        self.distances: List[int] = [UNREACHABLE] * len(self.edge_lengths)
+        self.settled = bytearray(len(self.edge_lengths))
+        self.explored = bytearray(len(self.edge_lengths))  # the edge length of the tile has been read
+        self.explored[self.target_tile] = 1
+
+    def is_valid(self, edge_lengths: np.ndarray) -> bool:
+        # whether the search gives the same distances with these edge lengths, which are then used when the search is resumed
+        explored = np.frombuffer(self.explored, dtype=bool)
+        if not np.array_equal(np.array(self.edge_lengths)[explored], edge_lengths.ravel()[explored]):
+            return False
+        self.edge_lengths = edge_lengths.ravel().tolist()
+        return True
+
+    def get_distance(self, tile) -> int:
+        # flat index y*width+x of the tile
+        if not self.settled[tile]:
+            self._resume(tile)
+        return self.distances[tile]
+
+    def get_distances(self) -> np.ndarray:
+        # distance of every tile, indexed [y,x]
+        self._resume(-1)
+        return np.array(self.distances).reshape(self.geometry.height, self.geometry.width)
+
+    @abc.abstractmethod
+    def _resume(self, until_tile):
+        # settle tiles until until_tile is settled, or every tile if it is -1
+        pass
+
+
+class HeapPathSearch(PathSearch):
+    """
+    Dijkstra search with a binary heap, that stops once the asked tile is settled
+    and is resumed from the same heap when a tile further away is asked
+    """
+    def __init__(self, geometry: MapGeometry, target, edge_lengths: np.ndarray):
+        super().__init__(geometry, target, edge_lengths)
+        self.heap: List[Tuple[int,int]] = [(0, self.target_tile)]
+
+    def _resume(self, until_tile):
+        adjacent_tiles, edge_lengths, distances = self.geometry.adjacent_tiles, self.edge_lengths, self.distances
+        settled, explored, heap = self.settled, self.explored, self.heap
+        while heap:
+            curdist, tile = heapq.heappop(heap)
+            if settled[tile]:
+                continue
+            settled[tile] = 1
+            distances[tile] = curdist
+            for adjacent_tile in adjacent_tiles[tile]:
+                if settled[adjacent_tile]:
+                    continue
+                explored[adjacent_tile] = 1
+                heapq.heappush(heap, (curdist + edge_lengths[adjacent_tile], adjacent_tile))
+            if tile == until_tile:
+                return
+
+
+class BucketPathSearch(PathSearch):
+    """
+    Dijkstra search with a bucket queue (Dial's algorithm), which suits the few small integer edge lengths
+    a bucket holds the tiles reached with one distance, and the buckets are reused in a circle
+    since no tile is pushed further than the longest edge from the distance being settled
+    """
+    def __init__(self, geometry: MapGeometry, target, edge_lengths: np.ndarray):
+        super().__init__(geometry, target, edge_lengths)
+        self.buckets: List[List[int]] = [[] for _ in range(EDGE_LENGTH_FUELED_CITY + 1)]
+        self.buckets[0].append(self.target_tile)
+        self.curdist = 0
+        self.pending = 1  # tiles in the buckets
+
+    def _resume(self, until_tile):
+        adjacent_tiles, edge_lengths, distances = self.geometry.adjacent_tiles, self.edge_lengths, self.distances
+        settled, explored, buckets = self.settled, self.explored, self.buckets
+        bucket_count = len(buckets)
+        curdist = self.curdist
+        try:
+            while self.pending:
+                bucket = buckets[curdist % bucket_count]
+                if not bucket:
+                    curdist += 1
+                    continue
+                tile = bucket.pop()
+                self.pending -= 1
+                if settled[tile]:
+                    continue
+                settled[tile] = 1
+                distances[tile] = curdist
+                for adjacent_tile in adjacent_tiles[tile]:
+                    if settled[adjacent_tile]:
+                        continue
+                    explored[adjacent_tile] = 1
+                    buckets[(curdist + edge_lengths[adjacent_tile]) % bucket_count].append(adjacent_tile)
+                    self.pending += 1
+                if tile == until_tile:
+                    return
+        finally:
+            self.curdist = curdist
+
+
+class SweepPathSearch(PathSearch):
+    """
+    settles the whole map at once with the array sweeps of calculate_weighted_distances
+    every edge length is read, so any change of edge length restarts the search
+    """
+    def _resume(self, until_tile):
+        height, width = self.geometry.height, self.geometry.width
+        edge_lengths = np.array(self.edge_lengths, dtype=np.int32).reshape(height, width)
+        target = divmod(self.target_tile, width)[::-1]
+        self.distances = calculate_weighted_distances(edge_lengths, [target]).ravel().tolist()
+        self.settled[:] = b"\x01" * len(self.settled)
+        self.explored[:] = b"\x01" * len(self.explored)
+
+
+class LandmarkSearch:
+    """
+    A* search for the distance between one pair of tiles, with the lower bounds of a few landmarks (ALT)
+    the distances from the landmarks are computed with lower_edge_lengths, which must not exceed the edge lengths of a query,
+    so that the bounds still hold when tiles become occupied after the landmarks are computed
+    """
+    def __init__(self, geometry: MapGeometry, lower_edge_lengths: np.ndarray, landmarks: List[Tuple[int,int]]):
+        self.geometry = geometry
+        self.lower_edge_lengths = lower_edge_lengths
+        self.landmarks = list(dict.fromkeys(landmarks))
+        self.fields: Tuple[np.ndarray, np.ndarray] = None
+
+    def get_fields(self) -> Tuple[np.ndarray, np.ndarray]:
+        # distances from and to each landmark, indexed [tile, landmark], computed when first used
+        if self.fields is None:
+            height, width = self.lower_edge_lengths.shape
+            from_landmarks = calculate_weighted_distances(self.lower_edge_lengths, self.landmarks).reshape(height * width, -1)
+            # the path to a landmark goes through the same tiles as the path from it
+            # except that the edge length of the landmark is paid instead of the edge length of the tile
+            edge_lengths = self.lower_edge_lengths.reshape(-1, 1)
+            landmark_tiles = [y * width + x for x,y in self.landmarks]
+            to_landmarks = from_landmarks - edge_lengths + edge_lengths[landmark_tiles, 0]
+            to_landmarks[landmark_tiles, np.arange(len(landmark_tiles))] = 0
+            self.fields = from_landmarks, to_landmarks
+        return self.fields
+
+    def get_heuristic(self, goal_tile) -> List[int]:
+        # lower bound of the distance from each tile to the goal, from the triangle inequality with each landmark
+        from_landmarks, to_landmarks = self.get_fields()
+        bounds = np.maximum(from_landmarks[goal_tile] - from_landmarks, to_landmarks - to_landmarks[goal_tile]).max(axis=1)
+        # every move costs at least one
+        manhattan = self.geometry.distance_between_tiles.reshape(len(bounds), len(bounds))[goal_tile]
+        return np.maximum(bounds, manhattan).tolist()
+
+    def get_distance(self, edge_lengths: np.ndarray, start, goal) -> int:
+        # distance of the path from start to goal, which pays the edge length of every tile it moves into like PathSearch
+        width = self.geometry.width
+        start_tile, goal_tile = start[1] * width + start[0], goal[1] * width + goal[0]
+        heuristic = self.get_heuristic(goal_tile)
+        edge_lengths = edge_lengths.ravel().tolist()
+        adjacent_tiles = self.geometry.adjacent_tiles
+        distances: Dict[int,int] = {start_tile: 0}
+        closed = bytearray(len(edge_lengths))
+        heap = [(heuristic[start_tile], start_tile)]
+        while heap:
+            _, tile = heapq.heappop(heap)
+            if tile == goal_tile:
+                return distances[tile]
+            if closed[tile]:
+                continue
+            closed[tile] = 1
+            curdist = distances[tile]
+            for adjacent_tile in adjacent_tiles[tile]:
+                if closed[adjacent_tile]:
+                    continue
+                distance = curdist + edge_lengths[adjacent_tile]
+                if distance < distances.get(adjacent_tile, UNREACHABLE):
+                    distances[adjacent_tile] = distance
+                    heapq.heappush(heap, (distance + heuristic[adjacent_tile], adjacent_tile))
+        return UNREACHABLE
+
+
+class DirectionField:
+    """
+    distance from every tile to a target, indexed [y,x], shared by the units moving to the target in a pass
+    the exact fields come from the same backend as Game.retrieve_distance
+    """
+    def __init__(self, distances: np.ndarray):
+        self.distances = distances
+
+
+# the kernels that PathDistanceCache can run, by name
+PATH_SEARCH_KERNELS = {
+    "heap": HeapPathSearch,
+    "bucket": BucketPathSearch,
+    "sweep": SweepPathSearch,
+}
+
+
+class PathDistanceCache:
+    """
+    path searches kept across turns, keyed by target, and dropped when the least recently used is over max_entries
+    a search is checked against the edge lengths of the tiles it has explored when it is first used in a calculate_features pass
+    within a pass the edge lengths are not checked again, so every lookup of a target in the pass sees the same distances
+    the kernel names one of PATH_SEARCH_KERNELS, all of them give the same distances
+    a target without a valid search is answered with the LandmarkSearch of the pass, if there is one,
+    until it has been asked max_single_pair_queries times in the pass, and then with a search that is kept
+    the LandmarkSearch is built by the function given to start_pass, on the first query that needs it
+    """
+    def __init__(self, geometry: MapGeometry, max_entries=64, kernel="heap", max_single_pair_queries=8):
+        self.geometry = geometry
+        self.max_entries = max_entries
+        self.kernel = kernel
+        self.search_class = PATH_SEARCH_KERNELS[kernel]
+        self.searches: OrderedDict = OrderedDict()
+        self.checked_targets = set()  # targets that have been checked in this pass
+        self.max_single_pair_queries = max_single_pair_queries
+        self.landmark_search: LandmarkSearch = None
+        self.build_landmark_search: Callable[[], LandmarkSearch] = None
+        self.pass_edge_lengths: Dict[Tuple[int,int], np.ndarray] = {}  # edge lengths of each target in this pass
+        self.single_pair_queries: DefaultDict[Tuple[int,int], int] = defaultdict(int)
+        # counted over the whole game, a hit reuses a kept search and a miss starts a new one
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.single_pair_searches = 0
+
+    def __reduce__(self):
+        # the searches are not saved with the game_state snapshot
+        return PathDistanceCache, (self.geometry, self.max_entries, self.kernel, self.max_single_pair_queries)
+
+    def set_kernel(self, kernel):
+        # the searches of the previous kernel are dropped
+        self.kernel = kernel
+        self.search_class = PATH_SEARCH_KERNELS[kernel]
+        self.searches = OrderedDict()
+        self.checked_targets = set()
+
+    def start_pass(self, build_landmark_search: Callable[[], LandmarkSearch] = None):
+        self.checked_targets = set()
+        self.landmark_search = None
+        self.build_landmark_search = build_landmark_search
+        self.pass_edge_lengths = {}
+        self.single_pair_queries = defaultdict(int)
+
+    def get_pass_edge_lengths(self, target, get_edge_lengths: Callable[[], np.ndarray]) -> np.ndarray:
+        # every query of a target in a pass uses the edge lengths of its first query
+        if target not in self.pass_edge_lengths:
+            self.pass_edge_lengths[target] = get_edge_lengths()
+        return self.pass_edge_lengths[target]
+
+    def get_valid_search(self, target, get_edge_lengths: Callable[[], np.ndarray]) -> PathSearch:
+        # the search of the target if there is one that is valid in this pass
+        search: PathSearch = self.searches.get(target)
+        if search is None:
+            return None
+        self.searches.move_to_end(target)
+        if target not in self.checked_targets:
+            if not search.is_valid(self.get_pass_edge_lengths(target, get_edge_lengths)):
+                self.invalidations += 1
+                del self.searches[target]
+                return None
+            self.checked_targets.add(target)
+        return search
+
+    def get_search(self, target, get_edge_lengths: Callable[[], np.ndarray]) -> PathSearch:
+        search = self.get_valid_search(target, get_edge_lengths)
+        if search is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            edge_lengths = self.get_pass_edge_lengths(target, get_edge_lengths)
+            search = self.searches[target] = self.search_class(self.geometry, target, edge_lengths)
+            while len(self.searches) > self.max_entries:
+                self.searches.popitem(last=False)
+            self.checked_targets.add(target)
+        return search
+
+    def get_distance(self, sx, sy, ex, ey, get_edge_lengths: Callable[[], np.ndarray]) -> int:
+        # the edge lengths are only computed if the target has not been asked in this pass
+        target = (ex,ey)
+        if (self.build_landmark_search is not None and self.single_pair_queries[target] < self.max_single_pair_queries and
+                self.get_valid_search(target, get_edge_lengths) is None):
+            if self.landmark_search is None:
+                self.landmark_search = self.build_landmark_search()
+            self.single_pair_queries[target] += 1
+            self.single_pair_searches += 1
+            return self.landmark_search.get_distance(self.get_pass_edge_lengths(target, get_edge_lengths), target, (sx,sy))
+
+        search = self.get_search(target, get_edge_lengths)
+        return search.get_distance(sy * self.geometry.width + sx)
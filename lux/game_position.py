@@ -1,6 +1,6 @@
 from lux import game
 import random
-from typing import List, Set, Tuple
+from typing import Dict, List, Set, Tuple
 
 from .constants import Constants
 
@@ -8,9 +8,28 @@ DIRECTIONS = Constants.DIRECTIONS
 
 
 class Position:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
+    """
+    Positions are never modified after they are created
+    Position(x, y) returns the interned Position from the active PositionTable if (x, y) is in it
+    """
+    __slots__ = ("x", "y", "_neighbours")
+
+    def __new__(cls, x, y):
+        table = active_position_table
+        if table is not None and -1 <= x <= table.width and -1 <= y <= table.height:
+            return table.positions[y+1][x+1]
+        return cls._create(x, y)
+
+    @classmethod
+    def _create(cls, x, y) -> 'Position':
+        pos = object.__new__(cls)
+        pos.x = x
+        pos.y = y
+        pos._neighbours = None
+        return pos
+
+    def __reduce__(self):
+        return (Position, (self.x, self.y))
 
     def __sub__(self, pos: 'Position') -> int:
         return abs(pos.x - self.x) + abs(pos.y - self.y)
@@ -31,6 +50,8 @@ class Position:
         return self == pos
 
     def translate(self, direction, units) -> 'Position':
+        if units == 1 and self._neighbours is not None:
+            return self._neighbours.get(direction)
         if direction == DIRECTIONS.NORTH:
             return Position(self.x, self.y - units)
         elif direction == DIRECTIONS.EAST:
@@ -48,3 +69,38 @@ class Position:
     def __iter__(self):
         for i in (self.x, self.y):
             yield i
+
+
+class PositionTable:
+    """
+    interned Positions of one map size and the neighbours of each Position
+    padded by one tile on each side, so that moving off the edge of the map is also interned
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.positions: List[List[Position]] = [
+            [Position._create(x, y) for x in range(-1, width+1)] for y in range(-1, height+1)]
+
+        for y in range(height):
+            for x in range(width):
+                self.positions[y+1][x+1]._neighbours = {
+                    DIRECTIONS.NORTH: self.positions[y][x+1],
+                    DIRECTIONS.EAST: self.positions[y+1][x+2],
+                    DIRECTIONS.SOUTH: self.positions[y+2][x+1],
+                    DIRECTIONS.WEST: self.positions[y+1][x],
+                    DIRECTIONS.CENTER: self.positions[y+1][x+1],
+                }
+
+
+position_tables: Dict[Tuple[int, int], PositionTable] = {}
+active_position_table: PositionTable = None
+
+
+def use_position_table(width, height) -> PositionTable:
+    # Positions created after this call are interned in the table of this map size
+    global active_position_table
+    if (width, height) not in position_tables:
+        position_tables[width, height] = PositionTable(width, height)
+    active_position_table = position_tables[width, height]
+    return active_position_table
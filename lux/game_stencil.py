@@ -0,0 +1,92 @@
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .game_labels import _overlapping_slices
+
+
+class Kernel:
+    """
+    the offsets (dy,dx) that are summed into each tile, new_matrix[y,x] = sum of matrix[y+dy,x+dx] on the map
+    """
+    def __init__(self, name: str, offsets: Sequence[Tuple[int,int]]):
+        self.name = name
+        self.offsets: List[Tuple[int,int]] = list(offsets)
+
+    @classmethod
+    def from_mask(cls, name: str, mask: np.ndarray) -> 'Kernel':
+        # the mask has an odd size and is centred on the tile
+        radius_y, radius_x = mask.shape[0]//2, mask.shape[1]//2
+        ys, xs = np.nonzero(mask)
+        return cls(name, [(dy, dx) for dy, dx in zip((ys - radius_y).tolist(), (xs - radius_x).tolist())])
+
+    @classmethod
+    def diamond(cls, name: str, radius) -> 'Kernel':
+        # tiles within the Manhattan distance
+        span = np.arange(-radius, radius+1)
+        return cls.from_mask(name, np.abs(span)[:,None] + np.abs(span)[None,:] <= radius)
+
+
+# the tile and the four adjacent tiles, where a worker collects resources from
+PLUS_KERNEL = Kernel.diamond("plus", 1)
+
+# tiles up to two steps away
+DIAMOND_KERNEL = Kernel.diamond("diamond", 2)
+
+
+def apply_kernel(matrix: np.ndarray, kernel: Kernel, out: np.ndarray = None) -> np.ndarray:
+    # convolve the last two axes, so a stack of matrices is convolved in one call
+    # the sum is in the dtype of out, which is the dtype of the matrix if out is not given
+    if out is None:
+        out = np.zeros_like(matrix)
+    else:
+        out[...] = 0
+    height, width = matrix.shape[-2:]
+    for dy, dx in kernel.offsets:
+        tile, neighbour = _overlapping_slices(dy, dx, height, width)
+        out[(Ellipsis,) + tile] += matrix[(Ellipsis,) + neighbour]
+    return out
+
+
+class StencilEngine:
+    """
+    convolutions of the features of one pass of calculate_features
+    the results are remembered for each input matrix until reset is called, inputs must not be modified in place after
+    batches are written into buffers that are reused by the next pass, copy a result to keep it beyond that
+    """
+    def __init__(self):
+        self.buffers: Dict[str, np.ndarray] = {}
+        self.results: Dict[Tuple[int, str], Tuple[np.ndarray, np.ndarray]] = {}
+
+    def __reduce__(self):
+        # the buffers and the remembered results are not saved with the game_state snapshot
+        return StencilEngine, ()
+
+    def reset(self):
+        self.results = {}
+
+    def _get_buffer(self, name, shape, dtype) -> np.ndarray:
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = self.buffers[name] = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def convolve(self, matrix: np.ndarray, kernel: Kernel = PLUS_KERNEL) -> np.ndarray:
+        key = (id(matrix), kernel.name)
+        if key in self.results and self.results[key][0] is matrix:
+            return self.results[key][1]
+        result = apply_kernel(matrix, kernel)
+        self.results[key] = (matrix, result)
+        return result
+
+    def convolve_batch(self, name: str, matrices: List[np.ndarray], kernel: Kernel = PLUS_KERNEL) -> np.ndarray:
+        # the matrices are stacked into the input buffer of the batch and convolved together into its output buffer
+        shape = (len(matrices),) + matrices[0].shape
+        dtype = np.result_type(*matrices)
+        stacked = self._get_buffer(name + ".input", shape, dtype)
+        for channel, matrix in enumerate(matrices):
+            stacked[channel] = matrix
+        result = apply_kernel(stacked, kernel, out=self._get_buffer(name, shape, dtype))
+        for matrix, convolved in zip(matrices, result):
+            self.results[id(matrix), kernel.name] = (matrix, convolved)
+        return result
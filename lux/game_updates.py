@@ -0,0 +1,121 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .constants import Constants
+
+INPUT_CONSTANTS = Constants.INPUT_CONSTANTS
+
+# one record array for each type of update line, rows are in the order of the lines
+RESEARCH_DTYPE = np.dtype([("team", np.int8), ("research_points", np.int32)])
+RESOURCE_DTYPE = np.dtype([("type", "U7"), ("x", np.int16), ("y", np.int16), ("amount", np.int32)])
+UNIT_DTYPE = np.dtype([("type", np.int8), ("team", np.int8), ("id", "U32"), ("x", np.int16), ("y", np.int16),
+                       ("cooldown", np.float64), ("wood", np.int32), ("coal", np.int32), ("uranium", np.int32)])
+CITY_DTYPE = np.dtype([("team", np.int8), ("id", "U32"), ("fuel", np.float64), ("light_upkeep", np.float64)])
+CITY_TILE_DTYPE = np.dtype([("team", np.int8), ("cityid", "U32"), ("x", np.int16), ("y", np.int16), ("cooldown", np.float64)])
+ROAD_DTYPE = np.dtype([("x", np.int16), ("y", np.int16), ("road", np.float64)])
+
+DTYPES = {
+    INPUT_CONSTANTS.RESEARCH_POINTS: RESEARCH_DTYPE,
+    INPUT_CONSTANTS.RESOURCES: RESOURCE_DTYPE,
+    INPUT_CONSTANTS.UNITS: UNIT_DTYPE,
+    INPUT_CONSTANTS.CITY: CITY_DTYPE,
+    INPUT_CONSTANTS.CITY_TILES: CITY_TILE_DTYPE,
+    INPUT_CONSTANTS.ROADS: ROAD_DTYPE,
+}
+
+
+def parse_update(update: str) -> Tuple[str, Tuple]:
+    # returns the input identifier and the parsed fields of one update line
+    strs = update.split(" ")
+    input_identifier = strs[0]
+
+    if input_identifier == INPUT_CONSTANTS.RESEARCH_POINTS:
+        team = int(strs[1])   # probably player_id
+        research_points = int(strs[2])
+        return input_identifier, (team, research_points)
+
+    elif input_identifier == INPUT_CONSTANTS.RESOURCES:
+        r_type = strs[1]
+        x = int(strs[2])
+        y = int(strs[3])
+        amt = int(float(strs[4]))
+        return input_identifier, (r_type, x, y, amt)
+
+    elif input_identifier == INPUT_CONSTANTS.UNITS:
+        unittype = int(strs[1])
+        team = int(strs[2])
+        unitid = strs[3]
+        x = int(strs[4])
+        y = int(strs[5])
+        cooldown = float(strs[6])
+        wood = int(strs[7])
+        coal = int(strs[8])
+        uranium = int(strs[9])
+        return input_identifier, (unittype, team, unitid, x, y, cooldown, wood, coal, uranium)
+
+    elif input_identifier == INPUT_CONSTANTS.CITY:
+        team = int(strs[1])
+        cityid = strs[2]
+        fuel = float(strs[3])
+        lightupkeep = float(strs[4])
+        return input_identifier, (team, cityid, fuel, lightupkeep)
+
+    elif input_identifier == INPUT_CONSTANTS.CITY_TILES:
+        team = int(strs[1])
+        cityid = strs[2]
+        x = int(strs[3])
+        y = int(strs[4])
+        cooldown = float(strs[5])
+        return input_identifier, (team, cityid, x, y, cooldown)
+
+    elif input_identifier == INPUT_CONSTANTS.ROADS:
+        x = int(strs[1])
+        y = int(strs[2])
+        road = float(strs[3])
+        return input_identifier, (x, y, road)
+
+    return input_identifier, ()
+
+
+class ParsedUpdates:
+    # the update lines of one turn as typed record arrays
+    # consumed by Game._update and by imitation_agent.make_input so that each line is parsed once per turn
+
+    def __init__(self, records_by_identifier: Dict[str, List[Tuple]], parsed_lines: Dict[str, Tuple]):
+        self.research: np.ndarray = np.array(records_by_identifier[INPUT_CONSTANTS.RESEARCH_POINTS], dtype=RESEARCH_DTYPE)
+        self.resources: np.ndarray = np.array(records_by_identifier[INPUT_CONSTANTS.RESOURCES], dtype=RESOURCE_DTYPE)
+        self.units: np.ndarray = np.array(records_by_identifier[INPUT_CONSTANTS.UNITS], dtype=UNIT_DTYPE)
+        self.cities: np.ndarray = np.array(records_by_identifier[INPUT_CONSTANTS.CITY], dtype=CITY_DTYPE)
+        self.citytiles: np.ndarray = np.array(records_by_identifier[INPUT_CONSTANTS.CITY_TILES], dtype=CITY_TILE_DTYPE)
+        self.roads: np.ndarray = np.array(records_by_identifier[INPUT_CONSTANTS.ROADS], dtype=ROAD_DTYPE)
+
+        # used to skip parsing the lines that are repeated in the next turn
+        self.parsed_lines: Dict[str, Tuple] = parsed_lines
+
+    def __getstate__(self):
+        # the cache of parsed lines is not saved with the game_state snapshot
+        state = self.__dict__.copy()
+        state["parsed_lines"] = {}
+        return state
+
+
+def parse_updates(messages: List[str], previous: ParsedUpdates = None) -> ParsedUpdates:
+    # lines that were already parsed in the previous turn are not split again
+    previous_lines = previous.parsed_lines if previous is not None else {}
+
+    parsed_lines: Dict[str, Tuple] = {}
+    records_by_identifier: Dict[str, List[Tuple]] = {input_identifier: [] for input_identifier in DTYPES}
+    for update in messages:
+        if update == INPUT_CONSTANTS.DONE:
+            break
+        if update in previous_lines:
+            input_identifier, fields = previous_lines[update]
+        else:
+            input_identifier, fields = parse_update(update)
+        if input_identifier not in records_by_identifier:
+            continue
+        parsed_lines[update] = (input_identifier, fields)
+        records_by_identifier[input_identifier].append(fields)
+
+    return ParsedUpdates(records_by_identifier, parsed_lines)
@@ -1,16 +1,19 @@
 # functions executing the actions
 
 import builtins as __builtin__
-from typing import Tuple, List, Set
+from typing import Dict, Tuple, List, Set
+
+import numpy as np
 
 from lux.game import Game, Mission, Missions, Observation, cleanup_missions
+from lux.game_moves import MoveCandidates, MoveQueue
 from lux.game_objects import Cargo, CityTile, Unit, City
 from lux.game_position import Position
 from lux.constants import Constants
 from lux.game_constants import GAME_CONSTANTS
 import lux.annotate as annotate
 
-from heuristics import find_best_cluster
+from heuristics import ClusterTargetScores, assign_cluster_targets, find_best_cluster
 from imitation_agent import get_imitation_action
 
 DIRECTIONS = Constants.DIRECTIONS
@@ -412,8 +415,42 @@ def make_unit_missions(game_state: Game, missions: Missions, is_subsequent_plan=
             if not unit.can_act():
                 break
 
+    # scores of the cluster targets of the units that are still to be planned
+    # the batch is kept up to date with the targets of the missions as they are added
+    cluster_target_scores: ClusterTargetScores = None
+
+    def get_cluster_target_scores(unit_index) -> ClusterTargetScores:
+        nonlocal cluster_target_scores
+        if cluster_target_scores is None or player.units[unit_index].id not in cluster_target_scores.row_of_unit:
+            cluster_target_scores = ClusterTargetScores(game_state, [
+                unit for unit in player.units[unit_index:] if unit.id not in game_state.unit_ids_with_missions_assigned_this_turn])
+        return cluster_target_scores
+
+    def plan_cluster_mission(unit: Unit, best_position: Position, best_cell_value, cluster_annotation):
+        print(unit.id, best_position, best_cell_value)
+        distance_from_best_position = game_state.retrieve_distance(unit.pos.x, unit.pos.y, best_position.x, best_position.y)
+        if best_cell_value > [0,0,0,0]:
+            print("plan mission adaptative", unit.id, unit.pos, "->", best_position, best_cell_value)
+            mission = Mission(unit.id, best_position, delays=distance_from_best_position)
+            missions.add(mission)
+            game_state.unit_ids_with_missions_assigned_this_turn.add(unit.id)
+            cluster_annotations.extend(cluster_annotation)
+            return
+
+        # homing mission
+        if unit.get_cargo_space_used() > 0:
+            homing_distance, homing_position = game_state.find_nearest_city_requiring_fuel(unit, DEBUG=DEBUG)
+            print("homing mission", unit.id, unit.pos, "->", homing_position, homing_distance)
+            mission = Mission(unit.id, homing_position, "", details="homing", delays=homing_distance + 2)
+            missions.add(mission)
+            game_state.unit_ids_with_missions_assigned_this_turn.add(unit.id)
+            return
+
+    # units whose cluster targets are assigned together, with the matching mission assignment
+    units_to_assign: List[Unit] = []
+
     # main sequence
-    for unit in player.units:
+    for unit_index, unit in enumerate(player.units):
         if unit.id in game_state.unit_ids_with_missions_assigned_this_turn:
             continue
         # mission is planned regardless whether the unit can act
@@ -475,7 +512,8 @@ def make_unit_missions(game_state: Game, missions: Missions, is_subsequent_plan=
             if not unit.can_act():
                 pass
             elif not full_resources_on_next_turn:
-                best_position, best_cell_value, cluster_annotation = find_best_cluster(game_state, unit, DEBUG=DEBUG, require_empty_target=True)
+                best_position, best_cell_value, cluster_annotation = find_best_cluster(game_state, unit, DEBUG=DEBUG, require_empty_target=True,
+                                                                                  scores=get_cluster_target_scores(unit_index))
                 distance_from_best_position = game_state.retrieve_distance(unit.pos.x, unit.pos.y, best_position.x, best_position.y)
                 if best_cell_value > [0,0,0,0]:
                     print("force empty cluster", unit.id, unit.pos, "->", best_position, best_cell_value)
@@ -637,25 +675,22 @@ def make_unit_missions(game_state: Game, missions: Missions, is_subsequent_plan=
                 cluster_annotations.append(annotation)
                 continue
 
-        best_position, best_cell_value, cluster_annotation = find_best_cluster(game_state, unit, DEBUG=DEBUG)
-        print(unit.id, best_position, best_cell_value)
-        distance_from_best_position = game_state.retrieve_distance(unit.pos.x, unit.pos.y, best_position.x, best_position.y)
-        if best_cell_value > [0,0,0,0]:
-            print("plan mission adaptative", unit.id, unit.pos, "->", best_position, best_cell_value)
-            mission = Mission(unit.id, best_position, delays=distance_from_best_position)
-            missions.add(mission)
-            game_state.unit_ids_with_missions_assigned_this_turn.add(unit.id)
-            cluster_annotations.extend(cluster_annotation)
+        if game_state.mission_assignment == "matching":
+            # the targets are assigned together after the other missions are planned
+            get_cluster_target_scores(unit_index)
+            units_to_assign.append(unit)
             continue
 
-        # homing mission
-        if unit.get_cargo_space_used() > 0:
-            homing_distance, homing_position = game_state.find_nearest_city_requiring_fuel(unit, DEBUG=DEBUG)
-            print("homing mission", unit.id, unit.pos, "->", homing_position, homing_distance)
-            mission = Mission(unit.id, homing_position, "", details="homing", delays=homing_distance + 2)
-            missions.add(mission)
-            game_state.unit_ids_with_missions_assigned_this_turn.add(unit.id)
-            continue
+        best_position, best_cell_value, cluster_annotation = find_best_cluster(game_state, unit, DEBUG=DEBUG,
+                                                                              scores=get_cluster_target_scores(unit_index))
+        plan_cluster_mission(unit, best_position, best_cell_value, cluster_annotation)
+
+    if units_to_assign:
+        game_state.repopulate_targets(missions)
+        assignment = assign_cluster_targets(game_state, units_to_assign, cluster_target_scores, DEBUG=DEBUG)
+        for unit in units_to_assign:
+            plan_cluster_mission(unit, *assignment[unit.id])
+        game_state.repopulate_targets(missions)
 
     return actions_ejections + cluster_annotations
 
@@ -668,13 +703,21 @@ def make_unit_actions(game_state: Game, missions: Missions, DEBUG=False) -> Tupl
     actions = []
 
     units_with_mission_but_no_action = set(missions.keys())
-    prev_actions_len = -1
 
-    # repeat attempting movements for the units until no additional movements can be added
-    while prev_actions_len < len(actions):
-      prev_actions_len = len(actions)
+    # cost terms of the moves of the units with missions, which do not change as the units move
+    units_with_mission = [unit for unit in player.units if unit.id in missions]
+    move_costs = calculate_move_costs(
+        game_state, units_with_mission,
+        [missions[unit.id].target_position for unit in units_with_mission],
+        ["homing" in missions[unit.id].details for unit in units_with_mission])
 
-      for unit in player.units:
+    # units that stayed, with the tiles around them that were taken for the next turn when they were evaluated
+    # the decision of a unit only changes once one of those tiles is taken or freed by another unit
+    units_waiting_on_tiles: Dict[str, Tuple[bool, ...]] = {}
+
+    # attempt movements for the units, the units that stay are attempted again when a tile around them is taken or freed
+    move_queue = MoveQueue(player.units, game_state.dirs_dxdy)
+    for index, unit in move_queue:
         if not unit.use_rule_base:
             continue
         if not unit.can_act():
@@ -711,12 +754,19 @@ def make_unit_actions(game_state: Game, missions: Missions, DEBUG=False) -> Tupl
             continue
 
         # attempt to move the unit
+        tiles_taken = get_tiles_taken_around(game_state, unit)
+        if units_waiting_on_tiles.get(unit.id) == tiles_taken:
+            move_queue.wait(index)
+            continue
         direction, pos = attempt_direction_to(game_state, unit, mission.target_position,
                                          avoid_opponent_units=("homing" in mission.details),
                                          use_exact=("homing" in mission.details),
-                                         DEBUG=DEBUG)
+                                         DEBUG=DEBUG, move_costs=move_costs)
         if direction == "c":
+            units_waiting_on_tiles[unit.id] = tiles_taken
+            move_queue.wait(index)
             continue
+        move_queue.wake([tuple(unit.pos), tuple(pos)])
 
         # if carrying full wood, and next location has abundant wood, if on buildable, build house now
         if game_state.convolved_wood_exist_matrix[pos.y, pos.x] > 1:
@@ -767,11 +817,22 @@ def make_unit_actions_supplementary(game_state: Game, missions: Missions, observ
 
     print("units without actions", [unit.id for unit in player.units if unit.can_act()])
 
+    # how each tile a unit can move into compares with the tile of the unit, indexed [unit, direction]
+    candidates = MoveCandidates(player.units, game_state.dirs_dxdy, game_state.map_width, game_state.map_height)
+    def get_decreases(matrix: np.ndarray) -> np.ndarray:
+        return candidates.gather(matrix) < candidates.gather_unit_tile(matrix)
+    moves_away_from_player_assets = \
+        candidates.gather(game_state.distance_from_player_assets) > candidates.gather_unit_tile(game_state.distance_from_player_assets)
+    moves_towards_collectable_resource = get_decreases(game_state.distance_from_collectable_resource)
+    moves_onto_lower_road = get_decreases(game_state.road_level_matrix)
+    moves_towards_preferred_median = get_decreases(game_state.distance_from_preferred_median)
+
     # probably should reduce code repetition in the following lines
     def make_random_move_to_void(unit: Unit, annotation: str = ""):
         if not unit.can_act():
             return
         (xxx,yyy) = (-1,-1)
+        row = candidates.row_of_unit[unit.id]
 
         # in increasing order of priority
 
@@ -783,27 +844,27 @@ def make_unit_actions_supplementary(game_state: Game, missions: Missions, observ
                 break
 
         # attempt to move away from your assets
-        for direction,(dx,dy) in zip(game_state.dirs, game_state.dirs_dxdy[:-1]):
+        for index,(direction,(dx,dy)) in enumerate(zip(game_state.dirs, game_state.dirs_dxdy[:-1])):
             xx,yy = unit.pos.x + dx, unit.pos.y + dy
             if (xx,yy) not in game_state.occupied_xy_set:
-                if game_state.distance_from_player_assets[yy,xx] > game_state.distance_from_player_assets[unit.pos.y,unit.pos.x]:
+                if moves_away_from_player_assets[row,index]:
                     xxx,yyy = xx,yy
                     break
 
         # attempt to move toward enemy assets
-        for direction,(dx,dy) in zip(game_state.dirs, game_state.dirs_dxdy[:-1]):
+        for index,(direction,(dx,dy)) in enumerate(zip(game_state.dirs, game_state.dirs_dxdy[:-1])):
             xx,yy = unit.pos.x + dx, unit.pos.y + dy
             if (xx,yy) not in game_state.occupied_xy_set and (xx,yy) not in game_state.player_city_tile_xy_set:
-                if game_state.distance_from_collectable_resource[yy,xx] < game_state.distance_from_collectable_resource[unit.pos.y,unit.pos.x]:
+                if moves_towards_collectable_resource[row,index]:
                     xxx,yyy = xx,yy
                     break
 
         # cart pave roads
         if unit.is_cart():
-            for direction,(dx,dy) in zip(game_state.dirs, game_state.dirs_dxdy[:-1]):
+            for index,(direction,(dx,dy)) in enumerate(zip(game_state.dirs, game_state.dirs_dxdy[:-1])):
                 xx,yy = unit.pos.x + dx, unit.pos.y + dy
                 if (xx,yy) not in game_state.occupied_xy_set:
-                    if game_state.road_level_matrix[yy,xx] < game_state.road_level_matrix[unit.pos.y,unit.pos.x]:
+                    if moves_onto_lower_road[row,index]:
                         xxx,yyy = xx,yy
                         break
 
@@ -827,12 +888,13 @@ def make_unit_actions_supplementary(game_state: Game, missions: Missions, observ
     def make_random_move_to_center(unit: Unit, annotation: str = ""):
         if not unit.can_act():
             return
-        for direction,(dx,dy) in zip(game_state.dirs, game_state.dirs_dxdy[:-1]):
+        row = candidates.row_of_unit[unit.id]
+        for index,(direction,(dx,dy)) in enumerate(zip(game_state.dirs, game_state.dirs_dxdy[:-1])):
             xx,yy = unit.pos.x + dx, unit.pos.y + dy
             if (xx,yy) in game_state.player_city_tile_xy_set:
                 continue
             if (xx,yy) not in game_state.occupied_xy_set:
-                if game_state.distance_from_preferred_median[yy,xx] < game_state.distance_from_preferred_median[unit.pos.y,unit.pos.x]:
+                if moves_towards_preferred_median[row,index]:
                     # attempt to collide together and build additional citytile
                     break
         else:
@@ -1097,92 +1159,103 @@ def make_unit_actions_supplementary(game_state: Game, missions: Missions, observ
     return actions
 
 
-def attempt_direction_to(game_state: Game, unit: Unit, target_pos: Position, avoid_opponent_units=False, use_exact=False, DEBUG=False) -> DIRECTIONS:
+def get_tiles_taken_around(game_state: Game, unit: Unit) -> Tuple[bool, ...]:
+    # whether each tile the unit could move into is taken for the next turn, in the order of game_state.dirs
+    x,y = unit.pos.x, unit.pos.y
+    occupied_xy_set = game_state.occupied_xy_set
+    return tuple((x+dx, y+dy) in occupied_xy_set for dx,dy in game_state.dirs_dxdy)
+
+
+def calculate_move_costs(game_state: Game, units: List[Unit], target_positions: List[Position],
+                         avoid_opponent_units: List[bool]) -> Tuple[MoveCandidates, np.ndarray, np.ndarray]:
+    # the cost terms of attempt_direction_to for a batch of units, indexed [unit, direction, term]
+    # the path distance is left for attempt_direction_to, as an exact field takes the edge lengths of its first query
+    # the first term is -1 where none of its rules apply, it then depends on whether the tile is taken when the unit moves
+    candidates = MoveCandidates(units, game_state.dirs_dxdy, game_state.map_width, game_state.map_height)
+    costs = np.zeros((len(units), len(game_state.dirs), 5), dtype=int)
+
+    player_city = candidates.gather_bitboard(game_state.player_city_tile_xy_set)
+    opponent_units = candidates.gather_bitboard(game_state.opponent_units_xy_set)
+    opponent_units_moveable = candidates.gather_bitboard(game_state.opponent_units_moveable_xy_set)
+    convolved_collectable = candidates.gather_bitboard(game_state.convolved_collectable_tiles_xy_set)
+    fueled_for_game = candidates.gather(game_state.matrix_player_cities_nights_of_fuel_required_for_game) < 0
+    wood = np.array([unit.cargo.wood for unit in units], dtype=int)[:,None]
+    coal_and_uranium = np.array([unit.cargo.coal + unit.cargo.uranium for unit in units], dtype=int)[:,None]
+
+    # if targeting same cluster, discourage walking on tiles without resources
+    # unless you have researched uranium or you have some resources, or you are very far from opponent
+    discouraged_from_leaving_resources = np.array([
+        game_state.xy_to_resource_group_id.find(tuple(target_pos)) == game_state.xy_to_resource_group_id.find(tuple(unit.pos)) and
+        not (game_state.player.researched_uranium_projected() or
+             unit.get_cargo_space_used() > 0 or
+             game_state.matrix_player_cities_nights_of_fuel_required_for_night[unit.pos.y, unit.pos.x] < 0) and
+        game_state.distance_from_opponent_assets[unit.pos.y,unit.pos.x] < 5
+        for unit, target_pos in zip(units, target_positions)], dtype=bool).reshape(-1, 1)
+
+    # the rules in increasing order of priority
+    occupancy_cost = costs[:,:,0]
+    occupancy_cost[:] = -1
+    occupancy_cost[opponent_units & np.array(avoid_opponent_units, dtype=bool).reshape(-1, 1)] = 1
+    occupancy_cost[opponent_units & ~opponent_units_moveable] = 3
+    # discourage going into a city tile if you are carrying substantial wood
+    occupancy_cost[(wood >= 60) & player_city] = 1
+    # no entering opponent citytile
+    occupancy_cost[candidates.gather_bitboard(game_state.opponent_city_tile_xy_set)] = 4
+    occupancy_cost[discouraged_from_leaving_resources & ~convolved_collectable] = 3
+    # discourage going into a fueled city tile if you are carrying substantial coal and uranium
+    occupancy_cost[(coal_and_uranium >= 10) & fueled_for_game & player_city] = 1
+
+    # manhattan distance to tie break
+    target_xs = np.array([target_pos.x for target_pos in target_positions], dtype=int)[:,None]
+    target_ys = np.array([target_pos.y for target_pos in target_positions], dtype=int)[:,None]
+    costs[:,:,2] = np.abs(candidates.xs - target_xs) + np.abs(candidates.ys - target_ys)
+
+    # prefer to walk on tiles with resources
+    costs[:,:,3] = -np.minimum(2, candidates.gather(game_state.convolved_collectable_tiles_matrix))
+
+    # prefer to walk closer to opponent
+    costs[:,:,4] = candidates.gather(game_state.distance_from_opponent_assets)
+
+    # discourage collision among yourself, if the tile is taken and is not your city tile, an opponent unit or your current position
+    blockable = ~player_city & ~opponent_units
+    blockable[:, game_state.dirs.index(DIRECTIONS.CENTER)] = False
+    return candidates, costs, blockable
+
+
+def attempt_direction_to(game_state: Game, unit: Unit, target_pos: Position, avoid_opponent_units=False, use_exact=False, DEBUG=False,
+                         move_costs: Tuple[MoveCandidates, np.ndarray, np.ndarray] = None) -> DIRECTIONS:
     if DEBUG: print = __builtin__.print
     else: print = lambda *args: None
 
-    smallest_cost = [2,2,2,2,2]
-    closest_dir = DIRECTIONS.CENTER
-    closest_pos = unit.pos
+    # the costs can be shared with the other units moved in this pass
+    if move_costs is None:
+        move_costs = calculate_move_costs(game_state, [unit], [target_pos], [avoid_opponent_units])
+    candidates, costs, blockable = move_costs
+    row = candidates.row_of_unit[unit.id]
+    costs = costs[row].copy()
 
-    for direction in game_state.dirs:
-        newpos = unit.pos.translate(direction, 1)
+    # path distance as main differentiator, from the field of the target shared with the other units going there
+    direction_field = game_state.get_direction_field(tuple(target_pos), use_exact=use_exact)
+    costs[:,1] = candidates.gather(direction_field.distances, row)
 
-        cost = [0,0,0,0,0]
+    occupied_xy_set = game_state.occupied_xy_set
+    for index, xy in enumerate(zip(candidates.xs[row].tolist(), candidates.ys[row].tolist())):
+        if costs[index,0] < 0:
+            costs[index,0] = 3 if blockable[row,index] and xy in occupied_xy_set else 0
 
-        # do not go out of map
-        if tuple(newpos) in game_state.xy_out_of_map:
-            continue
+    for index, direction in enumerate(game_state.dirs):
+        if candidates.inside_map[row,index]:
+            print(unit.pos.translate(direction, 1), costs[index].tolist())
 
-        # discourage collision among yourself
-        # discourage if new position is occupied, not your city tile and not your current position and not your enemy units
-        if tuple(newpos) in game_state.occupied_xy_set:
-            if tuple(newpos) not in game_state.player_city_tile_xy_set:
-                if tuple(newpos) not in game_state.opponent_units_xy_set:
-                    if tuple(newpos) != tuple(unit.pos):
-                        cost[0] = 3
-
-        if tuple(newpos) in game_state.opponent_units_xy_set:
-            if avoid_opponent_units:
-                cost[0] = 1
-            if tuple(newpos) not in game_state.opponent_units_moveable_xy_set:
-                cost[0] = 3
-
-        # discourage going into a city tile if you are carrying substantial wood
-        if unit.cargo.wood >= 96:
-            if tuple(newpos) in game_state.player_city_tile_xy_set:
-                cost[0] = 1
-
-        # discourage going into a city tile if you are carrying substantial wood
-        if unit.cargo.wood >= 60:
-            if tuple(newpos) in game_state.player_city_tile_xy_set:
-                cost[0] = 1
-
-        # no entering opponent citytile
-        if tuple(newpos) in game_state.opponent_city_tile_xy_set:
-            cost[0] = 4
-
-        # if targeting same cluster, discourage walking on tiles without resources
-        targeting_same_cluster = game_state.xy_to_resource_group_id.find(tuple(target_pos)) == game_state.xy_to_resource_group_id.find(tuple(unit.pos))
-        if targeting_same_cluster:
-            if tuple(newpos) not in game_state.convolved_collectable_tiles_xy_set:
-                # unless you have researched uranium or you have some resources
-                if not (game_state.player.researched_uranium_projected() or
-                        unit.get_cargo_space_used() > 0 or
-                        game_state.matrix_player_cities_nights_of_fuel_required_for_night[unit.pos.y, unit.pos.x] < 0):
-                    # unless you are very far from opponent
-                    if game_state.distance_from_opponent_assets[unit.pos.y,unit.pos.x] < 5:
-                        cost[0] = 3
-
-        # discourage going into a fueled city tile if you are carrying substantial coal and uranium
-        if unit.cargo.coal + unit.cargo.uranium >= 10:
-            if game_state.matrix_player_cities_nights_of_fuel_required_for_game[newpos.y, newpos.x] < 0:
-                if tuple(newpos) in game_state.player_city_tile_xy_set:
-                    cost[0] = 1
-
-        # path distance as main differentiator
-        path_dist = game_state.retrieve_distance(newpos.x, newpos.y, target_pos.x, target_pos.y, use_exact=use_exact)
-        cost[1] = path_dist
-
-        # manhattan distance to tie break
-        manhattan_dist = (newpos - target_pos)
-        cost[2] = manhattan_dist
-
-        # prefer to walk on tiles with resources
-        aux_cost = game_state.convolved_collectable_tiles_matrix[newpos.y, newpos.x]
-        cost[3] = -min(2,aux_cost)
-
-        # prefer to walk closer to opponent
-        aux_cost = game_state.distance_from_opponent_assets[newpos.y, newpos.x]
-        cost[4] = aux_cost
-
-        # update decision
-        if cost < smallest_cost:
-            smallest_cost = cost
-            closest_dir = direction
-            closest_pos = newpos
-
-        print(newpos, cost)
+    # smallest cost in lexicographic order, the first of game_state.dirs on a tie, among the tiles on the map
+    order = np.lexsort(costs.T[::-1])
+    best = next(index for index in order.tolist() if candidates.inside_map[row,index])
+
+    closest_dir = DIRECTIONS.CENTER
+    closest_pos = unit.pos
+    if costs[best].tolist() < [2,2,2,2,2]:
+        closest_dir = game_state.dirs[best]
+        closest_pos = unit.pos.translate(closest_dir, 1)
 
     if closest_dir != DIRECTIONS.CENTER:
         if tuple(closest_pos) not in game_state.opponent_unit_adjacent_xy_set: